@@ -0,0 +1,289 @@
+#agendador.py
+
+#Agendador de leituras da frota de medidores Saga 1000
+#Recebe um inventário (IP, porta, número de série, comandos e intervalo de leitura de cada medidor) e agrupa os
+#medidores por gateway (IP:porta): cada gateway tem uma fila serializada, já que o conversor RS-232/TCP só atende uma
+#conversa por vez, e gateways diferentes são atendidos em paralelo. Medidores mais atrasados são lidos primeiro,
+#falhas (WAIT/NAK/timeout) são reagendadas com recuo exponencial com jitter e medidores que falham seguidamente são
+#estacionados para não consumir o tempo do ciclo. Cada ciclo é comparado com a duração alvo.
+#Uso: python agendador.py inventario.json --alvo 60 --armazenamento leituras/
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from array import array
+from collections import namedtuple
+
+import codec14522
+import float24
+import instrumentacao
+import motor_assincrono
+import sessoes
+from armazenamento import ArmazenamentoLeituras
+
+logger = logging.getLogger('saga1000.agendador')
+
+# Medidor do inventário; 'intervalo' em segundos entre leituras
+ItemInventario = namedtuple('ItemInventario', 'ip porta numero_serie comandos intervalo',
+                            defaults=((0x14,), 900.0))
+
+# Resultado de um ciclo: duração real x alvo, medidores lidos, com falha, adiados (sem tempo no ciclo) e estacionados
+RelatorioCiclo = namedtuple('RelatorioCiclo', 'inicio duracao alvo lidos falhas adiados estacionados gateways')
+
+
+# Função que carrega o inventário de um arquivo JSON (lista de objetos com ip, porta, numero_serie, comandos, intervalo)
+def carregar_inventario(caminho) -> list:
+    with open(caminho, encoding='utf-8') as arquivo:
+        itens = json.load(arquivo)
+    inventario = []
+    for item in itens:
+        numero_serie = item['numero_serie']
+        if isinstance(numero_serie, str):
+            numero_serie = int(numero_serie, 0)
+        comandos = tuple(int(c, 0) if isinstance(c, str) else c for c in item.get('comandos', (0x14,)))
+        inventario.append(ItemInventario(item['ip'], int(item['porta']), numero_serie & 0xFFFFFF,
+                                         comandos, float(item.get('intervalo', 900.0))))
+    return inventario
+
+
+# Função que monta a mensagem de um comando para o medidor (comando 14 leva o número de série)
+def montar_mensagem(comando, numero_serie) -> bytes:
+    if comando == 0x14:
+        return codec14522.codificar_comando_14(numero_serie)
+    return codec14522.codificar_comando_generico(comando)
+
+
+# Estado de agendamento de um medidor
+class EstadoMedidor:
+    __slots__ = ('item', 'mensagens', 'proximo', 'falhas', 'estacionado_ate', 'ultimo_sucesso', 'leituras')
+
+    def __init__(self, item, proximo=0.0):
+        self.item = item
+        self.mensagens = [(comando, montar_mensagem(comando, item.numero_serie)) for comando in item.comandos]
+        self.proximo = proximo
+        self.falhas = 0
+        self.estacionado_ate = 0.0
+        self.ultimo_sucesso = None
+        self.leituras = 0
+
+
+class Agendador:
+    def __init__(self, inventario, gerenciador=None, armazenamento=None, duracao_alvo=60.0, prazo_medidor=30.0,
+                 gateways_simultaneos=100, recuo=None, recuo_wait=None, max_falhas=5, tempo_estacionado=3600.0,
+                 opcoes_transacao=None, ao_ler=None, semente=None):
+        aleatorio = random.Random(semente)
+        self.gerenciador = gerenciador if gerenciador is not None else sessoes.GerenciadorSessoes()
+        self.armazenamento = armazenamento
+        self.duracao_alvo = duracao_alvo
+        self.prazo_medidor = prazo_medidor
+        self.gateways_simultaneos = gateways_simultaneos
+        # Recuo entre ciclos para medidores que falharam; recuo_wait é o usado dentro da transação após WAIT/NAK
+        self.recuo = recuo or motor_assincrono.Recuo(base=30.0, maximo=3600.0, aleatorio=aleatorio)
+        self.recuo_wait = recuo_wait or motor_assincrono.Recuo(base=0.5, maximo=10.0, aleatorio=aleatorio)
+        self.max_falhas = max_falhas
+        self.tempo_estacionado = tempo_estacionado
+        self.opcoes_transacao = dict(opcoes_transacao or {})
+        # Chamado a cada resposta válida como ao_ler(item, comando, resposta)
+        self.ao_ler = ao_ler
+        self.gateways = {}
+        if armazenamento is not None:
+            for comando in {comando for item in inventario for comando in item.comandos}:
+                layout = float24.LAYOUTS.get(comando)
+                if layout is not None and sum(campo.quantidade for campo in layout) != armazenamento.valores_por_registro:
+                    raise ValueError(f"layout do comando 0x{comando:02X} não cabe nos registros do armazenamento")
+        for item in inventario:
+            proximo = 0.0
+            if armazenamento is not None:
+                marca = armazenamento.marca(item.numero_serie)
+                if marca is not None:
+                    proximo = marca + item.intervalo
+            self.gateways.setdefault((item.ip, item.porta), []).append(EstadoMedidor(item, proximo))
+        self.relatorios = []
+
+    def estados(self):
+        for estados in self.gateways.values():
+            yield from estados
+
+    # Função que retorna os medidores estacionados (falharam max_falhas vezes seguidas) e até quando
+    def estacionados(self, agora=None) -> list:
+        agora = time.time() if agora is None else agora
+        return [(estado.item, estado.estacionado_ate) for estado in self.estados() if estado.estacionado_ate > agora]
+
+    # Função que lê todos os comandos de um medidor; retorna True se todos tiveram resposta válida
+    # ou None se o tempo do ciclo acabou antes de começar um comando (o medidor não é penalizado)
+    async def _ler_medidor(self, estado, limite):
+        loop = asyncio.get_running_loop()
+        respostas = []
+        for comando, mensagem in estado.mensagens:
+            prazo = min(self.prazo_medidor, limite - loop.time())
+            if prazo <= 0:
+                return None
+            try:
+                resposta = await asyncio.wait_for(
+                    self.gerenciador.executar(estado.item.ip, estado.item.porta, mensagem, prazo=prazo,
+                                              recuo=self.recuo_wait, rotulo=f"{estado.item.numero_serie:06X}",
+                                              **self.opcoes_transacao), prazo + 1.0)
+            except (OSError, asyncio.TimeoutError):
+                self.gerenciador.fechar(estado.item.ip, estado.item.porta)
+                resposta = None
+            if resposta is None:
+                # Transação cortada pelo fim do ciclo: o medidor é adiado, não penalizado
+                return None if loop.time() >= limite else False
+            respostas.append((comando, resposta))
+        for comando, resposta in respostas:
+            if self.armazenamento is not None:
+                self._gravar(estado.item, comando, resposta)
+            if self.ao_ler is not None:
+                self.ao_ler(estado.item, comando, resposta)
+        return True
+
+    # Função que grava a resposta no armazenamento com o número de série do inventário; só os comandos com
+    # layout cadastrado em float24.LAYOUTS têm valores a gravar (os demais são apenas repassados a ao_ler)
+    def _gravar(self, item, comando, resposta):
+        layout = float24.LAYOUTS.get(comando)
+        if layout is None:
+            return
+        colunas = float24.decodificar_lote(resposta, layout)
+        valores = array('f')
+        for campo in layout:
+            valores.extend(colunas[campo.nome])
+        self.armazenamento.gravar_colunas([item.numero_serie], comando, valores)
+
+    # Ao fim do estacionamento o medidor volta com a contagem de falhas zerada: precisa falhar de novo max_falhas
+    # vezes seguidas (com o recuo normal entre elas) para ser estacionado outra vez
+    def _registrar(self, estado, sucesso, agora):
+        if estado.estacionado_ate:
+            estado.estacionado_ate = 0.0
+            estado.falhas = 0
+        if sucesso:
+            estado.falhas = 0
+            estado.leituras += 1
+            estado.ultimo_sucesso = agora
+            estado.proximo = agora + estado.item.intervalo
+            return
+        estado.falhas += 1
+        if estado.falhas >= self.max_falhas:
+            estado.estacionado_ate = agora + self.tempo_estacionado
+            estado.proximo = estado.estacionado_ate
+            logger.warning("medidor estacionado após %d falhas seguidas", estado.falhas,
+                           extra={'medidor': f"{estado.item.numero_serie:06X}",
+                                  'gateway': f"{estado.item.ip}:{estado.item.porta}"})
+        else:
+            estado.proximo = agora + min(estado.item.intervalo, self.recuo.atraso(estado.falhas))
+
+    # Função que atende a fila de um gateway: medidores vencidos, do mais atrasado para o menos atrasado, um por vez
+    async def _atender_gateway(self, estados, agora, limite, contadores, semaforo):
+        vencidos = sorted((estado for estado in estados
+                           if estado.proximo <= agora and estado.estacionado_ate <= agora),
+                          key=lambda estado: estado.proximo)
+        if not vencidos:
+            return
+        loop = asyncio.get_running_loop()
+        async with semaforo:
+            for posicao, estado in enumerate(vencidos):
+                if loop.time() >= limite:
+                    contadores['adiados'] += len(vencidos) - posicao
+                    return
+                sucesso = await self._ler_medidor(estado, limite)
+                if sucesso is None:
+                    contadores['adiados'] += len(vencidos) - posicao
+                    return
+                self._registrar(estado, sucesso, time.time())
+                contadores['lidos' if sucesso else 'falhas'] += 1
+
+    # Função que executa um ciclo: todos os gateways em paralelo, cada um com sua fila serializada
+    async def executar_ciclo(self) -> RelatorioCiclo:
+        loop = asyncio.get_running_loop()
+        agora = time.time()
+        inicio = loop.time()
+        limite = inicio + self.duracao_alvo
+        contadores = {'lidos': 0, 'falhas': 0, 'adiados': 0}
+        semaforo = asyncio.Semaphore(self.gateways_simultaneos)
+        # Os gateways entram na fila do semáforo na ordem do gather: o que tem o medidor vencido mais atrasado primeiro
+        filas = sorted(self.gateways.values(), key=lambda estados: min(
+            (estado.proximo for estado in estados if estado.proximo <= agora and estado.estacionado_ate <= agora),
+            default=float('inf')))
+        await asyncio.gather(*(self._atender_gateway(estados, agora, limite, contadores, semaforo)
+                               for estados in filas))
+        relatorio = RelatorioCiclo(agora, loop.time() - inicio, self.duracao_alvo, contadores['lidos'],
+                                   contadores['falhas'], contadores['adiados'], len(self.estacionados()),
+                                   len(self.gateways))
+        self.relatorios.append(relatorio)
+        logger.info(formatar_relatorio(relatorio), extra={'ciclo': relatorio._asdict()})
+        return relatorio
+
+    # Função que executa ciclos continuamente (ou 'ciclos' vezes), dormindo até o próximo medidor vencer
+    async def executar(self, ciclos=None):
+        feitos = 0
+        while ciclos is None or feitos < ciclos:
+            await self.executar_ciclo()
+            feitos += 1
+            if ciclos is not None and feitos >= ciclos:
+                break
+            proximo = min((max(estado.proximo, estado.estacionado_ate) for estado in self.estados()),
+                          default=time.time())
+            await asyncio.sleep(max(0.0, proximo - time.time()))
+
+
+def formatar_relatorio(relatorio) -> str:
+    situacao = "dentro do alvo" if relatorio.duracao <= relatorio.alvo else "acima do alvo"
+    return (f"ciclo: {relatorio.duracao:.2f} s de {relatorio.alvo:.2f} s ({situacao}) | "
+            f"lidos {relatorio.lidos}, falhas {relatorio.falhas}, adiados {relatorio.adiados}, "
+            f"estacionados {relatorio.estacionados}, gateways {relatorio.gateways}")
+
+
+# Opções de linha de comando de log e métricas, compartilhadas com servidor_modbus.py
+def adicionar_opcoes_observabilidade(parser):
+    parser.add_argument('--log-nivel', default='INFO', help="nível do log (DEBUG mostra cada etapa da transação)")
+    parser.add_argument('--log-formato', choices=('texto', 'json'), default='texto')
+    parser.add_argument('--metricas', default=None,
+                        help="arquivo das métricas por fase (.json ou texto do Prometheus); liga a instrumentação")
+    parser.add_argument('--intervalo-metricas', type=float, default=15.0)
+
+
+# Função que configura o log e, se pedido, liga a instrumentação e o exportador periódico (retornado para parar)
+def iniciar_observabilidade(args):
+    instrumentacao.configurar_log(args.log_nivel, args.log_formato)
+    if not args.metricas:
+        return None
+    return instrumentacao.ExportadorPeriodico(instrumentacao.ativar(), args.metricas,
+                                              args.intervalo_metricas).iniciar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agendador de leituras da frota Saga 1000")
+    parser.add_argument('inventario', help="arquivo JSON com a lista de medidores")
+    parser.add_argument('--alvo', type=float, default=60.0, help="duração alvo do ciclo em segundos")
+    parser.add_argument('--prazo-medidor', type=float, default=30.0)
+    parser.add_argument('--gateways-simultaneos', type=int, default=100)
+    parser.add_argument('--max-falhas', type=int, default=5)
+    parser.add_argument('--tempo-estacionado', type=float, default=3600.0)
+    parser.add_argument('--ciclos', type=int, default=None)
+    parser.add_argument('--armazenamento', default=None, help="diretório do armazenamento de leituras")
+    adicionar_opcoes_observabilidade(parser)
+    args = parser.parse_args()
+
+    armazenamento = None
+    if args.armazenamento:
+        armazenamento = ArmazenamentoLeituras(args.armazenamento)
+    agendador = Agendador(carregar_inventario(args.inventario), armazenamento=armazenamento,
+                          duracao_alvo=args.alvo, prazo_medidor=args.prazo_medidor,
+                          gateways_simultaneos=args.gateways_simultaneos, max_falhas=args.max_falhas,
+                          tempo_estacionado=args.tempo_estacionado)
+    exportador = iniciar_observabilidade(args)
+    try:
+        asyncio.run(agendador.executar(args.ciclos))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agendador.gerenciador.fechar_todas()
+        if armazenamento is not None:
+            armazenamento.fechar()
+        if exportador is not None:
+            exportador.parar()
+
+
+if __name__ == "__main__":
+    main()
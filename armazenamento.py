@@ -0,0 +1,320 @@
+#armazenamento.py
+
+#Armazenamento em disco das leituras decodificadas dos medidores Saga 1000
+#Cada leitura vira um registro binário de tamanho fixo (instante, número de série, comando e N valores float32)
+#anexado a arquivos de segmento mapeados em memória (mmap). Um índice por medidor (instantes ordenados + posição)
+#permite consultas por intervalo de tempo com busca binária, e a marca d'água (último instante gravado) de cada
+#medidor diz ao polling quais medidores já têm dados recentes e podem ser pulados.
+#O índice é salvo em 'indice.bin' ao sincronizar/fechar; registros gravados depois disso são reindexados ao abrir.
+import bisect
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from collections import namedtuple
+
+import float24
+
+MAGICO_SEGMENTO = b'SAGASEG1'
+MAGICO_INDICE = b'SAGAIDX1'
+TAMANHO_CABECALHO = 64
+VALORES_PADRAO = 84
+REGISTROS_POR_SEGMENTO = 1 << 18
+
+# Cabeçalho do segmento: mágico, valores por registro, capacidade (registros) e quantidade gravada
+_CABECALHO = struct.Struct('<8sIQ')
+_CONTAGEM = struct.Struct('<Q')
+_POSICAO_CONTAGEM = _CABECALHO.size
+# Início do registro: instante em milissegundos, número de série, comando (+ 3 bytes de alinhamento)
+_INICIO_REGISTRO = struct.Struct('<qIB3x')
+_INDICE_MEDIDOR = struct.Struct('<IQ')
+
+# Leitura retornada pelas consultas; 'instante' em segundos desde a época
+Registro = namedtuple('Registro', 'numero_serie instante comando valores')
+
+
+def _ms(instante):
+    return int(round(instante * 1000))
+
+
+def _bytes_little_endian(coluna):
+    if sys.byteorder == 'big':
+        coluna = array(coluna.typecode, coluna)
+        coluna.byteswap()
+    return coluna.tobytes()
+
+
+class _Segmento:
+    def __init__(self, caminho, valores_por_registro, capacidade):
+        tamanho_registro = _INICIO_REGISTRO.size + 4 * valores_por_registro
+        novo = not os.path.exists(caminho)
+        self.arquivo = open(caminho, 'w+b' if novo else 'r+b')
+        if novo:
+            self.arquivo.truncate(TAMANHO_CABECALHO + capacidade * tamanho_registro)
+        self.mapa = mmap.mmap(self.arquivo.fileno(), 0)
+        if novo:
+            _CABECALHO.pack_into(self.mapa, 0, MAGICO_SEGMENTO, valores_por_registro, capacidade)
+            _CONTAGEM.pack_into(self.mapa, _POSICAO_CONTAGEM, 0)
+        magico, valores, self.capacidade = _CABECALHO.unpack_from(self.mapa, 0)
+        if magico != MAGICO_SEGMENTO or valores != valores_por_registro or self.capacidade != capacidade:
+            raise ValueError(f"segmento incompatível: {caminho}")
+        self.tamanho_registro = tamanho_registro
+
+    @property
+    def contagem(self):
+        return _CONTAGEM.unpack_from(self.mapa, _POSICAO_CONTAGEM)[0]
+
+    @contagem.setter
+    def contagem(self, valor):
+        _CONTAGEM.pack_into(self.mapa, _POSICAO_CONTAGEM, valor)
+
+    def deslocamento(self, indice):
+        return TAMANHO_CABECALHO + indice * self.tamanho_registro
+
+    def fechar(self):
+        self.mapa.flush()
+        self.mapa.close()
+        self.arquivo.close()
+
+
+class ArmazenamentoLeituras:
+    def __init__(self, diretorio, valores_por_registro=VALORES_PADRAO, registros_por_segmento=REGISTROS_POR_SEGMENTO):
+        self.diretorio = diretorio
+        self.valores_por_registro = valores_por_registro
+        self.registros_por_segmento = registros_por_segmento
+        self.tamanho_registro = _INICIO_REGISTRO.size + 4 * valores_por_registro
+        self._valores = struct.Struct(f'<{valores_por_registro}f')
+        os.makedirs(diretorio, exist_ok=True)
+        self._segmentos = []
+        # numero_serie -> [instantes (ms), posições globais, ordenado]
+        self._indice = {}
+        self.total = 0
+        nomes = sorted(nome for nome in os.listdir(diretorio) if nome.startswith('segmento_'))
+        for nome in nomes:
+            segmento = _Segmento(os.path.join(diretorio, nome), valores_por_registro, registros_por_segmento)
+            self._segmentos.append(segmento)
+            self.total += segmento.contagem
+        self._reindexar(self._carregar_indice())
+
+    def __len__(self):
+        return self.total
+
+    def _caminho_segmento(self, numero):
+        return os.path.join(self.diretorio, f'segmento_{numero:06d}.dat')
+
+    # Função que retorna o segmento com espaço para o próximo registro, criando um novo se o atual estiver cheio
+    def _segmento_atual(self):
+        if not self._segmentos or self._segmentos[-1].contagem >= self._segmentos[-1].capacidade:
+            self._segmentos.append(_Segmento(self._caminho_segmento(len(self._segmentos)),
+                                             self.valores_por_registro, self.registros_por_segmento))
+        return self._segmentos[-1]
+
+    def _indexar(self, numero_serie, instante_ms, posicao):
+        entrada = self._indice.get(numero_serie)
+        if entrada is None:
+            entrada = self._indice[numero_serie] = [array('q'), array('Q'), True]
+        instantes = entrada[0]
+        if instantes and instante_ms < instantes[-1]:
+            entrada[2] = False
+        instantes.append(instante_ms)
+        entrada[1].append(posicao)
+
+    # Função que grava uma leitura; 'instante' em segundos (padrão: agora)
+    def gravar(self, numero_serie, comando, valores, instante=None):
+        instante_ms = _ms(time.time() if instante is None else instante)
+        segmento = self._segmento_atual()
+        indice = segmento.contagem
+        deslocamento = segmento.deslocamento(indice)
+        _INICIO_REGISTRO.pack_into(segmento.mapa, deslocamento, instante_ms, numero_serie, comando)
+        self._valores.pack_into(segmento.mapa, deslocamento + _INICIO_REGISTRO.size, *valores)
+        segmento.contagem = indice + 1
+        self._indexar(numero_serie, instante_ms, self.total)
+        self.total += 1
+
+    # Função que grava um lote de leituras já em colunas (ex.: saída de float24.decodificar_lote).
+    # 'valores' é um array('f') com valores_por_registro valores por leitura; 'instantes' pode ser um
+    # único instante para todo o lote. Os registros são montados com fatiamento estendido, sem laço por valor
+    def gravar_colunas(self, numeros_serie, comando, valores, instantes=None):
+        quantidade = len(numeros_serie)
+        if len(valores) != quantidade * self.valores_por_registro:
+            raise ValueError("quantidade de valores não corresponde ao número de leituras")
+        if instantes is None or isinstance(instantes, (int, float)):
+            instantes = [time.time() if instantes is None else instantes] * quantidade
+        instantes_ms = array('q', [_ms(instante) for instante in instantes])
+        series = array('I', numeros_serie)
+        bytes_instantes = _bytes_little_endian(instantes_ms)
+        bytes_series = _bytes_little_endian(series)
+        bytes_valores = _bytes_little_endian(array('f', valores))
+        tamanho = self.tamanho_registro
+        largura_valores = 4 * self.valores_por_registro
+        feitos = 0
+        while feitos < quantidade:
+            segmento = self._segmento_atual()
+            indice = segmento.contagem
+            parte = min(quantidade - feitos, segmento.capacidade - indice)
+            bloco = bytearray(parte * tamanho)
+            for j in range(8):
+                bloco[j::tamanho] = bytes_instantes[8 * feitos + j:8 * (feitos + parte):8]
+            for j in range(4):
+                bloco[8 + j::tamanho] = bytes_series[4 * feitos + j:4 * (feitos + parte):4]
+            bloco[12::tamanho] = bytes([comando]) * parte
+            for j in range(largura_valores):
+                bloco[16 + j::tamanho] = bytes_valores[largura_valores * feitos + j:largura_valores * (feitos + parte):largura_valores]
+            inicio = segmento.deslocamento(indice)
+            segmento.mapa[inicio:inicio + len(bloco)] = bloco
+            segmento.contagem = indice + parte
+            for k in range(feitos, feitos + parte):
+                self._indexar(series[k], instantes_ms[k], self.total + k - feitos)
+            self.total += parte
+            feitos += parte
+
+    # Função que decodifica respostas de 258 bytes do medidor (float24.decodificar_lote) e grava todas de uma vez
+    def gravar_respostas(self, respostas, instante=None, layout=None):
+        colunas = float24.decodificar_lote(respostas, layout)
+        series = colunas.pop('numero_serie')
+        if not series:
+            return
+        campos = list(colunas.values())
+        if len(campos) == 1:
+            valores = campos[0]
+        else:
+            valores = array('f')
+            for k in range(len(series)):
+                for coluna in campos:
+                    largura = len(coluna) // len(series)
+                    valores.extend(coluna[k * largura:(k + 1) * largura])
+        primeiro = respostas[0] if isinstance(respostas, (bytes, bytearray, memoryview)) else respostas[0][0]
+        self.gravar_colunas(series, primeiro, valores, instante)
+
+    def _ler(self, posicao):
+        segmento = self._segmentos[posicao // self.registros_por_segmento]
+        deslocamento = segmento.deslocamento(posicao % self.registros_por_segmento)
+        instante_ms, numero_serie, comando = _INICIO_REGISTRO.unpack_from(segmento.mapa, deslocamento)
+        valores = array('f')
+        valores.frombytes(segmento.mapa[deslocamento + _INICIO_REGISTRO.size:deslocamento + self.tamanho_registro])
+        if sys.byteorder == 'big':
+            valores.byteswap()
+        return Registro(numero_serie, instante_ms / 1000.0, comando, valores)
+
+    def _entrada_ordenada(self, numero_serie):
+        entrada = self._indice.get(numero_serie)
+        if entrada is not None and not entrada[2]:
+            pares = sorted(zip(entrada[0], entrada[1]))
+            entrada[0] = array('q', (instante for instante, _ in pares))
+            entrada[1] = array('Q', (posicao for _, posicao in pares))
+            entrada[2] = True
+        return entrada
+
+    # Função que retorna as leituras do medidor com inicio <= instante < fim (em segundos), em ordem de tempo
+    def consultar(self, numero_serie, inicio=None, fim=None) -> list:
+        entrada = self._entrada_ordenada(numero_serie)
+        if entrada is None:
+            return []
+        instantes, posicoes = entrada[0], entrada[1]
+        primeiro = 0 if inicio is None else bisect.bisect_left(instantes, _ms(inicio))
+        ultimo = len(instantes) if fim is None else bisect.bisect_left(instantes, _ms(fim))
+        return [self._ler(posicoes[i]) for i in range(primeiro, ultimo)]
+
+    # Função que retorna a marca d'água do medidor: instante (segundos) da leitura mais recente gravada, ou None
+    def marca(self, numero_serie):
+        entrada = self._entrada_ordenada(numero_serie)
+        if entrada is None or not entrada[0]:
+            return None
+        return entrada[0][-1] / 1000.0
+
+    # Função que retorna, dentre os medidores informados, os que não têm leitura gravada nos últimos 'intervalo' segundos
+    def pendentes(self, numeros_serie, intervalo, agora=None) -> list:
+        agora = time.time() if agora is None else agora
+        pendentes = []
+        for numero_serie in numeros_serie:
+            marca = self.marca(numero_serie)
+            if marca is None or agora - marca >= intervalo:
+                pendentes.append(numero_serie)
+        return pendentes
+
+    def medidores(self):
+        return list(self._indice)
+
+    # Função que lê o índice salvo; retorna quantos registros ele já cobre (0 se não existir ou estiver inconsistente)
+    def _carregar_indice(self):
+        caminho = os.path.join(self.diretorio, 'indice.bin')
+        if not os.path.exists(caminho):
+            return 0
+        with open(caminho, 'rb') as arquivo:
+            dados = arquivo.read()
+        magico, coberto, quantidade = struct.unpack_from('<8sQQ', dados, 0)
+        if magico != MAGICO_INDICE or coberto > self.total:
+            return 0
+        posicao = 24
+        indice = {}
+        for _ in range(quantidade):
+            numero_serie, tamanho = _INDICE_MEDIDOR.unpack_from(dados, posicao)
+            posicao += _INDICE_MEDIDOR.size
+            instantes = array('q')
+            instantes.frombytes(dados[posicao:posicao + 8 * tamanho])
+            posicao += 8 * tamanho
+            posicoes = array('Q')
+            posicoes.frombytes(dados[posicao:posicao + 8 * tamanho])
+            posicao += 8 * tamanho
+            indice[numero_serie] = [instantes, posicoes, True]
+        self._indice = indice
+        return coberto
+
+    # Função que indexa os registros gravados a partir da posição 'inicio' (extrai colunas por fatiamento estendido)
+    def _reindexar(self, inicio):
+        if inicio == 0:
+            self._indice = {}
+        tamanho = self.tamanho_registro
+        for numero, segmento in enumerate(self._segmentos):
+            base = numero * self.registros_por_segmento
+            contagem = segmento.contagem
+            if base + contagem <= inicio:
+                continue
+            primeiro = max(0, inicio - base)
+            quantidade = contagem - primeiro
+            inicio_bytes = segmento.deslocamento(primeiro)
+            bruto = segmento.mapa[inicio_bytes:inicio_bytes + quantidade * tamanho]
+            colunas_instantes = bytearray(8 * quantidade)
+            colunas_series = bytearray(4 * quantidade)
+            for j in range(8):
+                colunas_instantes[j::8] = bruto[j::tamanho]
+            for j in range(4):
+                colunas_series[j::4] = bruto[8 + j::tamanho]
+            instantes = array('q')
+            instantes.frombytes(colunas_instantes)
+            series = array('I')
+            series.frombytes(colunas_series)
+            if sys.byteorder == 'big':
+                instantes.byteswap()
+                series.byteswap()
+            for k in range(quantidade):
+                self._indexar(series[k], instantes[k], base + primeiro + k)
+
+    # Função que grava os segmentos em disco e salva o índice
+    def sincronizar(self):
+        for segmento in self._segmentos:
+            segmento.mapa.flush()
+        partes = [struct.pack('<8sQQ', MAGICO_INDICE, self.total, len(self._indice))]
+        for numero_serie in list(self._indice):
+            entrada = self._entrada_ordenada(numero_serie)
+            partes.append(_INDICE_MEDIDOR.pack(numero_serie, len(entrada[0])))
+            partes.append(entrada[0].tobytes())
+            partes.append(entrada[1].tobytes())
+        caminho = os.path.join(self.diretorio, 'indice.bin')
+        with open(caminho + '.tmp', 'wb') as arquivo:
+            arquivo.write(b''.join(partes))
+        os.replace(caminho + '.tmp', caminho)
+
+    def fechar(self):
+        self.sincronizar()
+        for segmento in self._segmentos:
+            segmento.fechar()
+        self._segmentos = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
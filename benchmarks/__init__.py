@@ -0,0 +1,2 @@
+#Benchmarks do projeto. Execute a partir da raiz do repositório, por exemplo:
+#    python -m benchmarks.codec
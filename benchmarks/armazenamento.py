@@ -0,0 +1,88 @@
+#benchmarks/armazenamento.py
+
+#Benchmark do armazenamento de leituras (armazenamento.py): taxa de gravação, latência de consulta por intervalo
+#e tempo de reabertura (com índice salvo e reconstruindo o índice a partir dos segmentos).
+#Uso: python -m benchmarks.armazenamento --registros 20000000 --valores 4 --medidores 20000
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from array import array
+
+from armazenamento import ArmazenamentoLeituras
+
+
+def percentil(valores_ordenados, p):
+    indice = min(len(valores_ordenados) - 1, int(round(p / 100.0 * (len(valores_ordenados) - 1))))
+    return valores_ordenados[indice]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do armazenamento de leituras")
+    parser.add_argument('--registros', type=int, default=1000000)
+    parser.add_argument('--valores', type=int, default=84, help="valores float32 por registro")
+    parser.add_argument('--medidores', type=int, default=5000)
+    parser.add_argument('--lote', type=int, default=5000, help="leituras por chamada de gravar_colunas")
+    parser.add_argument('--consultas', type=int, default=2000)
+    parser.add_argument('--diretorio', default=None, help="padrão: diretório temporário, removido ao final")
+    args = parser.parse_args()
+
+    diretorio = args.diretorio or tempfile.mkdtemp(prefix='saga_armazenamento_')
+    try:
+        inicio_tempo = 1_700_000_000.0
+        valores_lote = array('f', (float(i % 1000) for i in range(args.lote * args.valores)))
+        series_lote = [i % args.medidores for i in range(args.lote)]
+
+        with ArmazenamentoLeituras(diretorio, valores_por_registro=args.valores) as armazenamento:
+            inicio = time.perf_counter()
+            gravados = 0
+            ciclo = 0
+            while gravados < args.registros:
+                quantidade = min(args.lote, args.registros - gravados)
+                armazenamento.gravar_colunas(series_lote[:quantidade], 0x14, valores_lote[:quantidade * args.valores],
+                                             instantes=inicio_tempo + ciclo * 60.0)
+                gravados += quantidade
+                ciclo += 1
+            duracao = time.perf_counter() - inicio
+            print(f"gravar_colunas: {gravados} registros em {duracao:.2f} s -> {gravados / duracao:,.0f} registros/s")
+
+            individuais = min(100000, args.registros)
+            valores = list(valores_lote[:args.valores])
+            inicio = time.perf_counter()
+            for i in range(individuais):
+                armazenamento.gravar(i % args.medidores, 0x14, valores, instante=inicio_tempo + ciclo * 60.0)
+            duracao = time.perf_counter() - inicio
+            print(f"gravar:         {individuais} registros em {duracao:.2f} s -> {individuais / duracao:,.0f} registros/s")
+
+            aleatorio = random.Random(1)
+            fim_tempo = inicio_tempo + ciclo * 60.0
+            latencias = []
+            retornados = 0
+            for _ in range(args.consultas):
+                serie = aleatorio.randrange(args.medidores)
+                de = aleatorio.uniform(inicio_tempo, fim_tempo)
+                inicio = time.perf_counter()
+                retornados += len(armazenamento.consultar(serie, de, de + 3600.0))
+                latencias.append(time.perf_counter() - inicio)
+            latencias.sort()
+            print(f"consultar (1 h): {args.consultas} consultas, média {retornados / args.consultas:.1f} registros, "
+                  f"p50={percentil(latencias, 50) * 1e6:.0f} us p99={percentil(latencias, 99) * 1e6:.0f} us")
+
+        inicio = time.perf_counter()
+        with ArmazenamentoLeituras(diretorio, valores_por_registro=args.valores) as armazenamento:
+            total = len(armazenamento)
+        print(f"reabrir com índice salvo: {time.perf_counter() - inicio:.2f} s ({total} registros)")
+        os.remove(os.path.join(diretorio, 'indice.bin'))
+        inicio = time.perf_counter()
+        with ArmazenamentoLeituras(diretorio, valores_por_registro=args.valores):
+            pass
+        print(f"reabrir reconstruindo o índice: {time.perf_counter() - inicio:.2f} s")
+    finally:
+        if args.diretorio is None:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
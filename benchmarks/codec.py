@@ -0,0 +1,104 @@
+#benchmarks/codec.py
+
+#Micro-benchmark do codec NBR 14522 (codec14522) comparado com as funções originais bit a bit
+#Antes de medir, confere os dois lados contra vetores conhecidos (CRC-16 poly 0x8005, init 0xFFFF).
+#Uso: python -m benchmarks.codec [--repeticoes N]
+import argparse
+import os
+import struct
+import timeit
+
+import codec14522
+
+# Vetores conhecidos: (dados, CRC-16 esperado)
+VETORES_CRC = [
+    (b"123456789", 0xAEE7),
+    (bytes([0x14, 0x63, 0x00]), 0x4516),
+    (bytes([0x14, 0x01, 0x02, 0x03]) + bytes(60), 0xAF0A),
+]
+
+
+# Implementações originais de medidorSaga1000.py (sem os prints), usadas como referência
+def crc16_bit_a_bit(data: bytes):
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x8005) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+    return crc
+
+
+def complementar_bytes_original(data: bytes) -> bytes:
+    return bytes((~b) & 0xFF for b in data)
+
+
+def montar_comando_14_original(numero_serie: int):
+    dados = bytes([0x14]) + numero_serie.to_bytes(3, 'big') + bytes(60)
+    crc_bytes = struct.pack('>H', crc16_bit_a_bit(dados))
+    return complementar_bytes_original(dados + crc_bytes)
+
+
+def validar_crc_original(resposta: bytes):
+    if len(resposta) < 3:
+        return False
+    return resposta[-2:] == struct.pack('>H', crc16_bit_a_bit(resposta[:-2]))
+
+
+# Função que monta uma resposta de 258 bytes com CRC válido para os testes de validação
+def resposta_valida(semente: int = 0) -> bytes:
+    dados = bytes((semente + i) & 0xFF for i in range(codec14522.TAMANHO_RESPOSTA - 2))
+    return dados + struct.pack('>H', crc16_bit_a_bit(dados))
+
+
+def conferir_vetores():
+    for dados, esperado in VETORES_CRC:
+        assert crc16_bit_a_bit(dados) == esperado, dados
+        assert codec14522.crc16(dados) == esperado, dados
+        assert codec14522.CRC16(dados[:2]).update(dados[2:]).valor == esperado, dados
+    dados = os.urandom(300)
+    assert codec14522.complementar(dados) == complementar_bytes_original(dados)
+    for serie in (0x000000, 0x010203, 0xFFFFFF):
+        assert codec14522.codificar_comando_14(serie) == montar_comando_14_original(serie)
+    resposta = resposta_valida()
+    corrompida = bytes([resposta[0] ^ 0x01]) + resposta[1:]
+    assert codec14522.validar_quadro(resposta) and validar_crc_original(resposta)
+    assert not codec14522.validar_quadro(corrompida) and not validar_crc_original(corrompida)
+
+
+def medir(nome, original, novo, repeticoes):
+    t_original = min(timeit.repeat(original, number=repeticoes, repeat=3))
+    t_novo = min(timeit.repeat(novo, number=repeticoes, repeat=3))
+    print(f"{nome:<28} original {t_original / repeticoes * 1e6:9.2f} us   "
+          f"codec {t_novo / repeticoes * 1e6:9.2f} us   ganho {t_original / t_novo:6.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark do codec NBR 14522")
+    parser.add_argument('--repeticoes', type=int, default=2000)
+    args = parser.parse_args()
+    n = args.repeticoes
+
+    conferir_vetores()
+    print("Vetores conhecidos conferidos.\n")
+
+    resposta = resposta_valida()
+    comando = bytes(64)
+    lote = [resposta_valida(i) for i in range(100)]
+    contiguo = b''.join(lote)
+
+    medir("CRC-16 (258 bytes)", lambda: crc16_bit_a_bit(resposta), lambda: codec14522.crc16(resposta), n)
+    medir("complementar (66 bytes)", lambda: complementar_bytes_original(comando),
+          lambda: codec14522.complementar(comando), n)
+    medir("montar comando 14", lambda: montar_comando_14_original(0x010203),
+          lambda: codec14522.codificar_comando_14(0x010203), n)
+    medir("validar resposta (258 bytes)", lambda: validar_crc_original(resposta),
+          lambda: codec14522.validar_quadro(resposta), n)
+    medir("validar lote (100 respostas)", lambda: [validar_crc_original(r) for r in lote],
+          lambda: codec14522.validar_lote_contiguo(contiguo), max(1, n // 100))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#benchmarks/float24.py
+
+#Benchmark da decodificação Float24: conversão valor a valor (float24_to_float32) contra float24.decodificar_lote
+#Uso: python -m benchmarks.float24 [--respostas N]
+import argparse
+import os
+import time
+
+import float24
+import medidorSaga1000
+from codec14522 import TAMANHO_RESPOSTA
+
+
+# Decodificação original: um struct.unpack (e um bytes de 4 posições) por valor
+def decodificar_valor_a_valor(buffer, quadros):
+    valores = []
+    for k in range(quadros):
+        base = k * TAMANHO_RESPOSTA + 4
+        for i in range(base, base + 252, 3):
+            valores.append(medidorSaga1000.float24_to_float32(buffer[i], buffer[i + 1], buffer[i + 2]))
+    return valores
+
+
+def medir(nome, funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    return nome, time.perf_counter() - inicio, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da decodificação Float24 em bloco")
+    parser.add_argument('--respostas', type=int, default=20000)
+    args = parser.parse_args()
+    buffer = os.urandom(args.respostas * TAMANHO_RESPOSTA)
+    valores = args.respostas * 84
+
+    medicoes = [
+        medir("valor a valor", lambda: decodificar_valor_a_valor(buffer, args.respostas)),
+        medir("decodificar_lote (array)", lambda: float24.decodificar_lote(buffer)['registradores']),
+    ]
+    if float24.np is not None:
+        medicoes.append(medir("decodificar_lote (numpy)",
+                              lambda: float24.decodificar_lote(buffer, numpy=True)['registradores'].ravel()))
+    referencia = medicoes[0][2]
+    for nome, duracao, resultado in medicoes:
+        iguais = all(a == b or (a != a and b != b) for a, b in zip(referencia, resultado))
+        print(f"{nome:<26} {duracao * 1000:9.1f} ms  {valores / duracao / 1e6:7.2f} Mvalores/s  "
+              f"{'ok' if iguais and len(resultado) == len(referencia) else 'DIVERGENTE'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#benchmarks/modbus.py
+
+#Benchmark de latência de leitura do gateway Modbus (servidor_modbus.py) com clientes Modbus TCP locais
+#O cache é preenchido com respostas do simulador (sem polling), e várias threads com ModbusTcpClient (pymodbus)
+#leem grandezas de medidores aleatórios; informa leituras/s e percentis de latência.
+#Uso: python -m benchmarks.modbus --medidores 1000 --clientes 16 --leituras 2000
+import argparse
+import random
+import threading
+import time
+
+from pymodbus.client.sync import ModbusTcpClient
+
+import agendador
+import servidor_modbus
+import simulador
+
+
+def percentil(valores_ordenados, p):
+    indice = min(len(valores_ordenados) - 1, int(round(p / 100.0 * (len(valores_ordenados) - 1))))
+    return valores_ordenados[indice]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de latência do gateway Modbus")
+    parser.add_argument('--porta-modbus', type=int, default=15020)
+    parser.add_argument('--medidores', type=int, default=1000)
+    parser.add_argument('--clientes', type=int, default=16)
+    parser.add_argument('--leituras', type=int, default=2000, help="leituras por cliente")
+    parser.add_argument('--grandezas', type=int, default=8, help="grandezas lidas por requisição (4 registradores cada)")
+    args = parser.parse_args()
+
+    inventario = [agendador.ItemInventario('127.0.0.1', 5000, serie) for serie in range(1, args.medidores + 1)]
+    servidor = servidor_modbus.ServidorModbus(inventario, ('127.0.0.1', args.porta_modbus))
+    esperados = {}
+    for item in inventario:
+        medidor = simulador.MedidorVirtual(item.numero_serie)
+        servidor.cache.atualizar(item.numero_serie, bytes(medidor.dados_resposta(0x14)) + b'\0\0')
+        esperados[item.numero_serie] = medidor.registradores
+    servidor.iniciar(polling=False)
+    mapa = {}
+    for endereco in servidor.cache.mapa():
+        if endereco.grandeza == 0:
+            mapa[endereco.numero_serie] = endereco
+
+    latencias = []
+    erros = [0]
+    trava = threading.Lock()
+    quantidade = servidor_modbus.REGISTROS_POR_GRANDEZA * args.grandezas
+
+    def cliente(indice):
+        aleatorio = random.Random(indice)
+        conexao = ModbusTcpClient('127.0.0.1', port=args.porta_modbus)
+        conexao.connect()
+        locais = []
+        falhas = 0
+        for _ in range(args.leituras):
+            serie = aleatorio.randrange(1, args.medidores + 1)
+            endereco = mapa[serie]
+            inicio = time.perf_counter()
+            resposta = conexao.read_holding_registers(endereco.endereco, quantidade, unit=endereco.unidade)
+            locais.append(time.perf_counter() - inicio)
+            if resposta.isError():
+                falhas += 1
+                continue
+            valor, instante = servidor_modbus.decodificar_registros(resposta.registers[:4])
+            if abs(valor - esperados[serie][0]) > abs(esperados[serie][0]) * 1e-4 or instante == 0:
+                falhas += 1
+        conexao.close()
+        with trava:
+            latencias.extend(locais)
+            erros[0] += falhas
+
+    threads = [threading.Thread(target=cliente, args=(i,)) for i in range(args.clientes)]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duracao = time.perf_counter() - inicio
+    servidor.parar()
+
+    latencias.sort()
+    print(f"{len(latencias)} leituras de {quantidade} registradores por {args.clientes} clientes em {duracao:.2f} s "
+          f"-> {len(latencias) / duracao:,.0f} leituras/s, {erros[0]} erros")
+    print("latência (ms): " + "  ".join(f"p{p}={percentil(latencias, p) * 1000:.2f}" for p in (50, 90, 99, 99.9)))
+
+
+if __name__ == "__main__":
+    main()
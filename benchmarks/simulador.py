@@ -0,0 +1,180 @@
+#benchmarks/simulador.py
+
+#Benchmark de vazão do caminho de polling contra o simulador local (simulador.py)
+#Sobe o simulador em um subprocesso, dispara enviar_comando a partir de várias threads (uma conexão por thread)
+#ou consultar_frota com sessões persistentes, e informa transações/s e percentis de latência.
+#Com --instrumentacao, liga a instrumentação por fase e mostra o tempo médio de cada fase e os eventos contados
+#(compare com a execução sem a opção para ver o custo da instrumentação).
+#Uso: python -m benchmarks.simulador --conexoes 8 --transacoes 2000 --latencia 0.002 [--instrumentacao]
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import instrumentacao
+import medidorSaga1000
+import motor_assincrono
+import sessoes
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Função que sobe o simulador em um subprocesso e espera a porta TCP aceitar conexões
+def iniciar_simulador(args):
+    comando = [sys.executable, os.path.join(RAIZ, 'simulador.py'), '--host', args.host,
+               '--porta', str(args.porta), '--portas', str(args.portas), '--porta-udp', '0',
+               '--latencia', str(args.latencia), '--prob-wait', str(args.prob_wait),
+               '--prob-nak', str(args.prob_nak), '--prob-lixo', str(args.prob_lixo),
+               '--prob-fragmentar', str(args.prob_fragmentar), '--semente', '1']
+    processo = subprocess.Popen(comando, stdout=subprocess.DEVNULL)
+    limite = time.monotonic() + 10
+    while time.monotonic() < limite:
+        try:
+            socket.create_connection((args.host, args.porta + args.portas - 1), timeout=0.5).close()
+            return processo
+        except OSError:
+            time.sleep(0.05)
+    processo.kill()
+    raise RuntimeError("simulador não respondeu")
+
+
+def percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return float('nan')
+    indice = min(len(valores_ordenados) - 1, int(round(p / 100.0 * (len(valores_ordenados) - 1))))
+    return valores_ordenados[indice]
+
+
+def relatorio(nome, latencias, falhas, duracao):
+    latencias.sort()
+    print(f"\n{nome}: {len(latencias)} transações OK, {falhas} falhas em {duracao:.2f} s "
+          f"-> {len(latencias) / duracao:.1f} transações/s")
+    print("latência (ms): " + "  ".join(
+        f"p{p}={percentil(latencias, p) * 1000:.2f}" for p in (50, 90, 99, 99.9)) +
+        f"  max={latencias[-1] * 1000 if latencias else float('nan'):.2f}")
+
+
+# Modo síncrono: cada thread abre uma conexão e chama enviar_comando em sequência
+def medir_sincrono(args):
+    latencias = []
+    falhas = [0]
+    trava = threading.Lock()
+    por_thread = args.transacoes // args.conexoes
+
+    def trabalhador(indice):
+        porta = args.porta + indice % args.portas
+        mensagem = medidorSaga1000.montar_comando_14(0x010000 + indice)
+        locais = []
+        erros = 0
+        with socket.create_connection((args.host, porta), timeout=5) as sock:
+            for _ in range(por_thread):
+                inicio = time.perf_counter()
+                if medidorSaga1000.enviar_comando(sock, mensagem) is None:
+                    erros += 1
+                else:
+                    locais.append(time.perf_counter() - inicio)
+        medidorSaga1000.fechar_loop()
+        with trava:
+            latencias.extend(locais)
+            falhas[0] += erros
+
+    threads = [threading.Thread(target=trabalhador, args=(i,)) for i in range(args.conexoes)]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    relatorio("enviar_comando (threads)", latencias, falhas[0], time.perf_counter() - inicio)
+
+
+# Modo frota: consultar_frota com sessões persistentes, 'conexoes' medidores em paralelo
+def medir_frota(args):
+    medidores = [motor_assincrono.Medidor(args.host, args.porta + i % args.portas,
+                                          medidorSaga1000.montar_comando_14(0x010000 + i))
+                 for i in range(args.conexoes)]
+    latencias = []
+    falhas = 0
+    duracao = 0.0
+
+    async def rodar():
+        nonlocal falhas, duracao
+        with sessoes.GerenciadorSessoes() as gerenciador:
+            # Primeira rodada (fora da medição) faz a ativação UDP e abre as conexões
+            async for _ in motor_assincrono.consultar_frota(medidores, concorrencia=args.conexoes,
+                                                            prazo=10.0, sessoes=gerenciador):
+                pass
+            inicio = time.perf_counter()
+            restantes = args.transacoes
+            while restantes > 0:
+                lote = medidores[:restantes]
+                restantes -= len(lote)
+                async for resultado in motor_assincrono.consultar_frota(
+                        lote, concorrencia=args.conexoes, prazo=10.0, sessoes=gerenciador):
+                    if resultado.resposta is None:
+                        falhas += 1
+                    else:
+                        latencias.append(resultado.duracao)
+            duracao = time.perf_counter() - inicio
+            print(f"sessões: {gerenciador.estatisticas()}")
+
+    asyncio.run(rodar())
+    relatorio("consultar_frota (sessões)", latencias, falhas, duracao)
+
+
+# Função que soma os histogramas de todos os medidores e mostra o tempo médio por fase e o total de cada evento
+def resumo_instrumentacao(inst):
+    dados = inst.instantaneo()
+    fases = {}
+    for h in dados['histogramas']:
+        total, soma = fases.get(h['fase'], (0, 0.0))
+        fases[h['fase']] = (total + h['total'], soma + h['soma'])
+    eventos = {}
+    for e in dados['eventos']:
+        eventos[e['evento']] = eventos.get(e['evento'], 0) + e['total']
+    print("fases (média em ms): " + "  ".join(
+        f"{fase}={fases[fase][1] / fases[fase][0] * 1000:.3f}" for fase in instrumentacao.FASES if fase in fases))
+    print(f"eventos: {eventos}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de polling contra o simulador Saga 1000")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=15000)
+    parser.add_argument('--portas', type=int, default=8)
+    parser.add_argument('--conexoes', type=int, default=8)
+    parser.add_argument('--transacoes', type=int, default=2000)
+    parser.add_argument('--latencia', type=float, default=0.0)
+    parser.add_argument('--prob-wait', type=float, default=0.0)
+    parser.add_argument('--prob-nak', type=float, default=0.0)
+    parser.add_argument('--prob-lixo', type=float, default=0.0)
+    parser.add_argument('--prob-fragmentar', type=float, default=0.0)
+    parser.add_argument('--modo', choices=('sincrono', 'frota', 'ambos'), default='ambos')
+    parser.add_argument('--externo', action='store_true', help="usa um simulador já em execução")
+    parser.add_argument('--instrumentacao', action='store_true', help="liga a instrumentação por fase")
+    parser.add_argument('--metricas', default=None, help="grava o instantâneo final (.json ou Prometheus)")
+    args = parser.parse_args()
+
+    processo = None if args.externo else iniciar_simulador(args)
+    try:
+        for modo, medir in (('sincrono', medir_sincrono), ('frota', medir_frota)):
+            if args.modo not in (modo, 'ambos'):
+                continue
+            inst = instrumentacao.ativar() if args.instrumentacao or args.metricas else None
+            medir(args)
+            if inst is not None:
+                resumo_instrumentacao(inst)
+                if args.metricas:
+                    inst.exportar(args.metricas, 'json' if args.metricas.endswith('.json') else 'prometheus')
+        instrumentacao.desativar()
+    finally:
+        if processo is not None:
+            processo.terminate()
+            processo.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#codec14522.py
+
+#Codec de quadros do protocolo ABNT NBR 14522 usado pelos medidores Saga 1000
+#Concentra o cálculo do CRC-16 (tabela pré-calculada, forma incremental), a complementação de bytes
+#por tabela de tradução e a validação de respostas sem copiar o payload (memoryview).
+#Também oferece uma API em lote para codificar/validar muitos quadros em uma única chamada.
+import struct
+
+ENQ = 0x05   # Enquiry: sinaliza intenção de comunicação
+ACK = 0x06   # Acknowledge: confirmação de recebimento
+NAK = 0x15   # Negative Acknowledge: erro na recepção
+WAIT = 0x10  # Dispositivo ocupado, espere
+ALO = 0xFF   # “ALO” é um byte específico desse medidor para iniciar a comunicação
+
+POLINOMIO_CRC16 = 0x8005
+CRC16_INICIAL = 0xFFFF
+
+# Tamanhos padrão dos quadros da NBR 14522 (64 bytes + CRC no comando, 256 bytes + CRC na resposta)
+TAMANHO_COMANDO = 66
+TAMANHO_RESPOSTA = 258
+
+_CRC = struct.Struct('>H')
+
+
+# Função que gera a tabela de 256 entradas do CRC-16 (MSB primeiro, polinômio 0x8005)
+def _gerar_tabela_crc16(polinomio: int = POLINOMIO_CRC16):
+    tabela = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ polinomio) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+        tabela.append(crc)
+    return tuple(tabela)
+
+
+TABELA_CRC16 = _gerar_tabela_crc16()
+
+# Tabela de tradução que inverte os bits de cada byte (0x00 -> 0xFF, 0x01 -> 0xFE, ...)
+TABELA_COMPLEMENTO = bytes(range(255, -1, -1))
+
+
+# Função que atualiza um CRC-16 parcial com mais dados, permitindo calcular o CRC em pedaços
+def atualizar_crc16(crc: int, dados) -> int:
+    tabela = TABELA_CRC16
+    for byte in dados:
+        crc = ((crc << 8) & 0xFFFF) ^ tabela[(crc >> 8) ^ byte]
+    return crc
+
+
+# Função que calcula o CRC-16 completo de um bloco de dados (bytes, bytearray ou memoryview)
+def crc16(dados) -> int:
+    return atualizar_crc16(CRC16_INICIAL, dados)
+
+
+# Classe para cálculo incremental do CRC-16, no mesmo estilo do hashlib (update/valor/digest)
+class CRC16:
+    __slots__ = ('valor',)
+
+    def __init__(self, dados=b''):
+        self.valor = CRC16_INICIAL
+        if dados:
+            self.update(dados)
+
+    def update(self, dados):
+        self.valor = atualizar_crc16(self.valor, dados)
+        return self
+
+    def digest(self) -> bytes:
+        return _CRC.pack(self.valor)
+
+
+# Função que complementa os bytes (inverte os bits) usando a tabela de tradução
+def complementar(dados) -> bytes:
+    if isinstance(dados, memoryview):
+        dados = dados.tobytes()
+    return dados.translate(TABELA_COMPLEMENTO)
+
+
+# Função que monta um quadro completo: dados + CRC-16 (big-endian), tudo complementado
+def codificar_quadro(dados) -> bytes:
+    tamanho = len(dados)
+    quadro = bytearray(tamanho + 2)
+    quadro[:tamanho] = dados
+    _CRC.pack_into(quadro, tamanho, crc16(dados))
+    return bytes(quadro.translate(TABELA_COMPLEMENTO))
+
+
+# Função que monta o comando 14 (código, número de série de 3 bytes e 60 bytes nulos) já codificado
+def codificar_comando_14(numero_serie: int) -> bytes:
+    dados = bytearray(TAMANHO_COMANDO - 2)
+    dados[0] = 0x14
+    dados[1:4] = (numero_serie & 0xFFFFFF).to_bytes(3, 'big')
+    return codificar_quadro(dados)
+
+
+# Função que monta um comando genérico (código, byte de comando 0x63 e argumento) prefixado por ENQ
+def codificar_comando_generico(codigo: int, argumento: int = 0x00) -> bytes:
+    return bytes([ENQ]) + codificar_quadro(bytes([codigo, 0x63, argumento]))
+
+
+# Função que lê o CRC recebido nos 2 últimos bytes do quadro, sem fatiar
+def crc_recebido(quadro) -> int:
+    return (quadro[-2] << 8) | quadro[-1]
+
+
+# Função que valida o CRC-16 de um quadro recebido sem copiar o payload
+def validar_quadro(quadro) -> bool:
+    if len(quadro) < 3:
+        return False
+    visao = memoryview(quadro)
+    return crc16(visao[:-2]) == crc_recebido(visao)
+
+
+# Função que codifica vários quadros em uma única chamada
+def codificar_lote(lista_dados) -> list:
+    return [codificar_quadro(dados) for dados in lista_dados]
+
+
+# Função que valida vários quadros em uma única chamada, retornando uma lista de booleanos
+def validar_lote(quadros) -> list:
+    return [validar_quadro(quadro) for quadro in quadros]
+
+
+# Função que valida quadros de tamanho fixo concatenados em um único buffer (ex.: várias respostas de 258 bytes)
+def validar_lote_contiguo(buffer, tamanho_quadro: int = TAMANHO_RESPOSTA) -> list:
+    visao = memoryview(buffer)
+    resultados = []
+    for inicio in range(0, len(visao) - tamanho_quadro + 1, tamanho_quadro):
+        quadro = visao[inicio:inicio + tamanho_quadro]
+        resultados.append(crc16(quadro[:-2]) == crc_recebido(quadro))
+    return resultados
@@ -0,0 +1,157 @@
+#float24.py
+
+#Decodificação em bloco de valores Float24 das respostas do medidor Saga 1000 (protocolo ABNT NBR 14522)
+#Em vez de converter 3 bytes por vez com struct.unpack, os bytes de cada campo são remontados como float32
+#com fatiamento estendido (algumas cópias por campo, nenhuma alocação por valor) e entregues em colunas
+#array('f') ou, se o NumPy estiver instalado, em arrays float32.
+#O layout de cada comando (posição, quantidade, passo e escala dos campos) é configurável; a escala é aplicada
+#sem alocação por valor quando o NumPy está instalado (nos dois tipos de coluna).
+import sys
+from array import array
+from collections import namedtuple
+
+from codec14522 import TAMANHO_RESPOSTA
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Campo de uma resposta: 'quantidade' valores Float24 a partir de 'posicao', separados por 'passo' bytes.
+# O valor final é valor * escala + deslocamento
+Campo = namedtuple('Campo', 'nome posicao quantidade passo escala deslocamento', defaults=(3, 1.0, 0.0))
+
+# Layouts por código de comando. A resposta começa com o código (1 byte) e o número de série (3 bytes)
+LAYOUTS = {
+    0x14: (Campo('registradores', 4, (TAMANHO_RESPOSTA - 2 - 4) // 3),),
+}
+LAYOUT_PADRAO = LAYOUTS[0x14]
+
+
+# Função que retorna o layout de um comando, ou o layout padrão se ele não estiver cadastrado
+def layout_do_comando(codigo: int):
+    return LAYOUTS.get(codigo, LAYOUT_PADRAO)
+
+
+def _como_bytes(dados):
+    if isinstance(dados, (bytes, bytearray)):
+        return dados
+    if isinstance(dados, memoryview):
+        return dados.tobytes()
+    return b''.join(dados)
+
+
+# Função que monta os bytes float32 (little-endian) de um campo em todos os quadros.
+# Escolhe fatiar por valor (3 * quantidade fatias) ou por quadro (3 * quadros fatias), o que for menor
+def _bytes_float32(buffer, quadros, tamanho_quadro, campo):
+    q = campo.quantidade
+    saida = bytearray(4 * q * quadros)
+    if q <= quadros:
+        for i in range(q):
+            for j in range(3):
+                inicio = campo.posicao + i * campo.passo + j
+                saida[4 * i + 1 + j::4 * q] = buffer[inicio:inicio + (quadros - 1) * tamanho_quadro + 1:tamanho_quadro]
+    else:
+        for k in range(quadros):
+            for j in range(3):
+                inicio = k * tamanho_quadro + campo.posicao + j
+                saida[4 * q * k + 1 + j:4 * q * (k + 1):4] = buffer[inicio:inicio + campo.passo * (q - 1) + 1:campo.passo]
+    return saida
+
+
+# Função que confere se todos os valores do campo cabem em um quadro de 'tamanho' bytes
+def _conferir_campo(campo, tamanho):
+    if campo.posicao < 0 or campo.quantidade < 0 or campo.passo < 1:
+        raise ValueError(f"campo '{campo.nome}' inválido: {campo}")
+    if campo.quantidade and campo.posicao + campo.passo * (campo.quantidade - 1) + 3 > tamanho:
+        raise ValueError(f"campo '{campo.nome}' ({campo.quantidade} valores a partir de {campo.posicao}, "
+                         f"passo {campo.passo}) não cabe em {tamanho} bytes")
+
+
+# Escala e deslocamento são aplicados no próprio buffer do array('f') com o NumPy, sem alocar um float por valor.
+# Sem o NumPy, só campos com escala/deslocamento passam por um laço por valor (caminho lento, mas correto)
+def _coluna_array(buffer, quadros, tamanho_quadro, campo):
+    coluna = array('f')
+    coluna.frombytes(_bytes_float32(buffer, quadros, tamanho_quadro, campo))
+    if sys.byteorder == 'big':
+        coluna.byteswap()
+    if campo.escala != 1.0 or campo.deslocamento != 0.0:
+        if np is not None:
+            visao = np.asarray(memoryview(coluna))
+            if campo.escala != 1.0:
+                np.multiply(visao, np.float32(campo.escala), out=visao)
+            if campo.deslocamento != 0.0:
+                np.add(visao, np.float32(campo.deslocamento), out=visao)
+        else:
+            for i, valor in enumerate(coluna):
+                coluna[i] = valor * campo.escala + campo.deslocamento
+    return coluna
+
+
+def _coluna_numpy(matriz, campo):
+    indices = campo.posicao + np.arange(campo.quantidade) * campo.passo
+    bits = ((matriz[:, indices].astype(np.uint32) << 8) |
+            (matriz[:, indices + 1].astype(np.uint32) << 16) |
+            (matriz[:, indices + 2].astype(np.uint32) << 24))
+    coluna = bits.view(np.float32)
+    if campo.escala != 1.0 or campo.deslocamento != 0.0:
+        coluna = (coluna * np.float32(campo.escala) + np.float32(campo.deslocamento)).astype(np.float32)
+    return coluna
+
+
+# Função que decodifica 'quantidade' Float24 consecutivos (ou espaçados por 'passo') de uma única resposta
+def decodificar_float24(dados, posicao=0, quantidade=None, passo=3) -> array:
+    dados = _como_bytes(dados)
+    if not 0 <= posicao <= len(dados):
+        raise ValueError(f"posição {posicao} fora dos dados ({len(dados)} bytes)")
+    if quantidade is None:
+        quantidade = max(0, (len(dados) - posicao - 3) // passo + 1)
+    campo = Campo('valores', posicao, quantidade, passo)
+    _conferir_campo(campo, len(dados))
+    return _coluna_array(dados, 1, len(dados), campo)
+
+
+# Função que decodifica um lote de respostas de tamanho fixo em colunas, uma por campo do layout.
+# 'respostas' pode ser um buffer contíguo ou uma lista de respostas. Com numpy=False cada coluna é um
+# array('f') linear (quadro a quadro); com numpy=True é um array float32 de forma (quadros, quantidade).
+# A coluna 'numero_serie' traz o número de série (bytes 1 a 3) de cada resposta
+def decodificar_lote(respostas, layout=None, tamanho_quadro=TAMANHO_RESPOSTA, numpy=False) -> dict:
+    buffer = _como_bytes(respostas)
+    quadros = len(buffer) // tamanho_quadro
+    if layout is None:
+        layout = layout_do_comando(buffer[0]) if quadros else LAYOUT_PADRAO
+    for campo in layout:
+        _conferir_campo(campo, tamanho_quadro)
+    colunas = {}
+    if numpy:
+        if np is None:
+            raise ImportError("numpy não está instalado")
+        matriz = np.frombuffer(buffer, dtype=np.uint8, count=quadros * tamanho_quadro).reshape(quadros, tamanho_quadro)
+        serie = matriz[:, 1:4].astype(np.uint32)
+        colunas['numero_serie'] = (serie[:, 0] << 16) | (serie[:, 1] << 8) | serie[:, 2]
+        for campo in layout:
+            colunas[campo.nome] = _coluna_numpy(matriz, campo)
+        return colunas
+    serie = bytearray(4 * quadros)
+    for j in range(3):
+        serie[1 + j::4] = buffer[1 + j:1 + j + (quadros - 1) * tamanho_quadro + 1:tamanho_quadro] if quadros else b''
+    colunas['numero_serie'] = array('I')
+    colunas['numero_serie'].frombytes(serie)
+    if sys.byteorder == 'little':
+        colunas['numero_serie'].byteswap()
+    for campo in layout:
+        colunas[campo.nome] = _coluna_array(buffer, quadros, tamanho_quadro, campo)
+    return colunas
+
+
+# Função que converte valores float para Float24 em bloco (inverso de decodificar_float24)
+def codificar_float24(valores) -> bytes:
+    brutos = array('f', valores)
+    if sys.byteorder == 'big':
+        brutos.byteswap()
+    brutos = brutos.tobytes()
+    saida = bytearray(3 * (len(brutos) // 4))
+    saida[0::3] = brutos[1::4]
+    saida[1::3] = brutos[2::4]
+    saida[2::3] = brutos[3::4]
+    return bytes(saida)
@@ -0,0 +1,189 @@
+#instrumentacao.py
+
+#Instrumentação do caminho de leitura dos medidores Saga 1000
+#Registra, por medidor e por fase (ativação UDP, envio do ALO, espera do ENQ, envio do comando, recepção da resposta,
+#verificação do CRC), a duração em histogramas de baldes fixos, e conta os eventos WAIT/NAK/CRC inválido/timeout.
+#Desligada por padrão: o caminho quente só consulta atual() uma vez por transação e não mede nada se for None.
+#Os resultados podem ser exportados periodicamente em JSON ou no formato texto do Prometheus (node_exporter textfile).
+#Também configura o logging estruturado (texto ou JSON) que substitui os prints de acompanhamento.
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+FASES = ('ativacao_udp', 'envio_alo', 'espera_enq', 'envio_comando', 'recepcao_resposta', 'verificacao_crc')
+EVENTOS = ('sucesso', 'falha', 'wait', 'nak', 'crc_invalido', 'timeout')
+
+# Limites superiores dos baldes, em segundos
+LIMITES_PADRAO = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+_atual = None
+
+# Sem configurar_log, as mensagens do projeto não aparecem (nem as de WARNING, via logging.lastResort)
+logging.getLogger('saga1000').addHandler(logging.NullHandler())
+
+
+class Histograma:
+    __slots__ = ('limites', 'contagens', 'soma', 'total')
+
+    def __init__(self, limites=LIMITES_PADRAO):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.contagens[bisect.bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    # Função que retorna as contagens acumuladas por limite (inclui +Inf no final)
+    def acumulado(self):
+        acumulado = []
+        total = 0
+        for contagem in self.contagens:
+            total += contagem
+            acumulado.append(total)
+        return acumulado
+
+
+class Instrumentacao:
+    def __init__(self, limites=LIMITES_PADRAO):
+        self.limites = tuple(limites)
+        self.inicio = time.time()
+        self._histogramas = {}
+        self._eventos = {}
+        self._trava = threading.Lock()
+
+    # Função que registra a duração (segundos) de uma fase para um medidor
+    def observar(self, medidor, fase, duracao):
+        with self._trava:
+            histograma = self._histogramas.get((medidor, fase))
+            if histograma is None:
+                histograma = self._histogramas[(medidor, fase)] = Histograma(self.limites)
+            histograma.observar(duracao)
+
+    # Função que soma 'quantidade' ocorrências de um evento (wait, nak, crc_invalido, timeout, ...) para um medidor
+    def contar(self, medidor, evento, quantidade=1):
+        with self._trava:
+            chave = (medidor, evento)
+            self._eventos[chave] = self._eventos.get(chave, 0) + quantidade
+
+    def zerar(self):
+        with self._trava:
+            self._histogramas = {}
+            self._eventos = {}
+            self.inicio = time.time()
+
+    # Função que retorna uma cópia dos dados no formato usado pelo JSON exportado
+    def instantaneo(self) -> dict:
+        with self._trava:
+            histogramas = [
+                {'medidor': medidor, 'fase': fase, 'total': h.total, 'soma': h.soma, 'contagens': list(h.contagens)}
+                for (medidor, fase), h in sorted(self._histogramas.items())
+            ]
+            eventos = [{'medidor': medidor, 'evento': evento, 'total': total}
+                       for (medidor, evento), total in sorted(self._eventos.items())]
+        return {'inicio': self.inicio, 'instante': time.time(), 'limites': list(self.limites),
+                'histogramas': histogramas, 'eventos': eventos}
+
+    def json(self) -> str:
+        return json.dumps(self.instantaneo(), ensure_ascii=False)
+
+    # Função que gera o texto no formato de exposição do Prometheus
+    def prometheus(self) -> str:
+        dados = self.instantaneo()
+        limites = [repr(float(limite)) for limite in dados['limites']] + ['+Inf']
+        linhas = ['# HELP saga_fase_segundos Duração de cada fase da transação NBR 14522.',
+                  '# TYPE saga_fase_segundos histogram']
+        for h in dados['histogramas']:
+            rotulos = f'medidor="{h["medidor"]}",fase="{h["fase"]}"'
+            acumulado = 0
+            for limite, contagem in zip(limites, h['contagens']):
+                acumulado += contagem
+                linhas.append(f'saga_fase_segundos_bucket{{{rotulos},le="{limite}"}} {acumulado}')
+            linhas.append(f'saga_fase_segundos_sum{{{rotulos}}} {h["soma"]!r}')
+            linhas.append(f'saga_fase_segundos_count{{{rotulos}}} {h["total"]}')
+        linhas.append('# HELP saga_eventos_total Eventos do protocolo (WAIT, NAK, CRC inválido, timeout, ...).')
+        linhas.append('# TYPE saga_eventos_total counter')
+        for e in dados['eventos']:
+            linhas.append(f'saga_eventos_total{{medidor="{e["medidor"]}",evento="{e["evento"]}"}} {e["total"]}')
+        return '\n'.join(linhas) + '\n'
+
+    # Função que grava o instantâneo em arquivo de forma atômica; formato 'json' ou 'prometheus'
+    def exportar(self, caminho, formato='prometheus'):
+        conteudo = self.json() if formato == 'json' else self.prometheus()
+        temporario = caminho + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(conteudo)
+        os.replace(temporario, caminho)
+
+
+# Thread que exporta o instantâneo a cada 'intervalo' segundos (e uma última vez ao parar)
+class ExportadorPeriodico:
+    def __init__(self, instrumentacao, caminho, intervalo=15.0, formato=None):
+        self.instrumentacao = instrumentacao
+        self.caminho = caminho
+        self.intervalo = intervalo
+        self.formato = formato or ('json' if caminho.endswith('.json') else 'prometheus')
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, daemon=True)
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            self.instrumentacao.exportar(self.caminho, self.formato)
+        self.instrumentacao.exportar(self.caminho, self.formato)
+
+    def iniciar(self):
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+        self._thread.join()
+
+
+# Função que liga a instrumentação global (usada pelo motor assíncrono) e a retorna
+def ativar(limites=LIMITES_PADRAO) -> Instrumentacao:
+    global _atual
+    _atual = Instrumentacao(limites)
+    return _atual
+
+
+def desativar():
+    global _atual
+    _atual = None
+
+
+# Função consultada pelo caminho quente: retorna a instrumentação ativa ou None
+def atual():
+    return _atual
+
+
+# Formatter que escreve cada registro de log como um objeto JSON, incluindo os campos passados em 'extra'
+class FormatadorJson(logging.Formatter):
+    _PADRAO = set(vars(logging.makeLogRecord({})))
+
+    def format(self, registro):
+        dados = {'instante': registro.created, 'nivel': registro.levelname, 'logger': registro.name,
+                 'mensagem': registro.getMessage()}
+        for chave, valor in vars(registro).items():
+            if chave not in self._PADRAO and chave not in dados:
+                dados[chave] = valor
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+# Função que configura o logging dos módulos do projeto (logger 'saga1000'); formato 'texto' ou 'json'
+def configurar_log(nivel='WARNING', formato='texto'):
+    manipulador = logging.StreamHandler()
+    if formato == 'json':
+        manipulador.setFormatter(FormatadorJson())
+    else:
+        manipulador.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    logger = logging.getLogger('saga1000')
+    logger.handlers[:] = [manipulador]
+    logger.setLevel(nivel.upper() if isinstance(nivel, str) else nivel)
+    logger.propagate = False
+    return logger
@@ -0,0 +1,90 @@
+#leitor_quadros.py
+
+#Leitor incremental de quadros do protocolo ABNT NBR 14522 (lado de recepção)
+#Usa um bytearray pré-alocado preenchido com recv_into, procura os bytes de controle (ENQ/ACK/NAK/WAIT)
+#e monta respostas de tamanho fixo mesmo quando chegam em vários segmentos TCP, sem copiar os dados.
+#Bytes que chegam depois de um quadro (pipeline) ficam guardados para o próximo.
+import asyncio
+
+from codec14522 import ENQ, ACK, NAK, WAIT, TAMANHO_RESPOSTA
+
+CONTROLES = frozenset((ENQ, ACK, NAK, WAIT))
+
+
+class LeitorQuadros:
+    def __init__(self, capacidade=4096, tamanho_resposta=TAMANHO_RESPOSTA):
+        if capacidade < tamanho_resposta:
+            raise ValueError("capacidade menor que o tamanho da resposta")
+        self.tamanho_resposta = tamanho_resposta
+        self._buffer = bytearray(capacidade)
+        self._visao = memoryview(self._buffer)
+        self._inicio = 0
+        self._fim = 0
+        self.leituras = 0
+
+    def __len__(self):
+        return self._fim - self._inicio
+
+    # Função que retorna a área livre do buffer para recv_into, compactando os dados pendentes se necessário
+    def espaco_livre(self) -> memoryview:
+        if self._inicio == self._fim:
+            self._inicio = self._fim = 0
+        elif len(self._buffer) - self._fim < self.tamanho_resposta:
+            pendente = self._fim - self._inicio
+            self._buffer[:pendente] = self._visao[self._inicio:self._fim].tobytes()
+            self._inicio, self._fim = 0, pendente
+        return self._visao[self._fim:]
+
+    # Função que registra 'n' bytes recém-escritos em espaco_livre()
+    def confirmar(self, n: int):
+        self._fim += n
+        self.leituras += 1
+
+    # Função que descarta bytes até o byte de controle indicado (inclusive); retorna False se ele não chegou ainda
+    def consumir_ate(self, controle: int = ENQ) -> bool:
+        posicao = self._buffer.find(controle, self._inicio, self._fim)
+        if posicao < 0:
+            self._inicio = self._fim
+            return False
+        self._inicio = posicao + 1
+        return True
+
+    # Função que retorna o próximo quadro completo (byte de controle isolado ou resposta de tamanho fixo)
+    # como memoryview sobre o buffer interno, ou None se ainda faltam bytes.
+    # A visão só é válida até o próximo espaco_livre(); copie com bytes() se precisar guardá-la.
+    def proximo_quadro(self):
+        if self._inicio == self._fim:
+            return None
+        if self._buffer[self._inicio] in CONTROLES:
+            tamanho = 1
+        elif self._fim - self._inicio >= self.tamanho_resposta:
+            tamanho = self.tamanho_resposta
+        else:
+            return None
+        quadro = self._visao[self._inicio:self._inicio + tamanho]
+        self._inicio += tamanho
+        return quadro
+
+    # Função que entrega tudo o que está pendente (quadro incompleto), esvaziando o leitor
+    def consumir_pendente(self):
+        quadro = self._visao[self._inicio:self._fim]
+        self._inicio = self._fim
+        return quadro
+
+    # Função que descarta os bytes pendentes
+    def limpar(self):
+        self._inicio = self._fim = 0
+
+    # Função que lê do socket bloqueante para o buffer; retorna o número de bytes (0 = conexão encerrada)
+    def preencher(self, sock) -> int:
+        n = sock.recv_into(self.espaco_livre())
+        if n:
+            self.confirmar(n)
+        return n
+
+    # Função que lê do socket não bloqueante para o buffer usando o loop asyncio
+    async def preencher_async(self, sock) -> int:
+        n = await asyncio.get_running_loop().sock_recv_into(sock, self.espaco_livre())
+        if n:
+            self.confirmar(n)
+        return n
@@ -0,0 +1,293 @@
+#motor_assincrono.py
+
+#Motor asyncio para consultar vários medidores Saga 1000 ao mesmo tempo (protocolo ABNT NBR 14522)
+#Implementa a mesma máquina de estados ALO -> ENQ -> comando -> WAIT/NAK/ACK de medidorSaga1000.py,
+#mas sem bloquear: cada medidor tem um prazo (deadline) próprio em vez de um número fixo de tentativas,
+#o número de conversas simultâneas é limitado e os resultados são entregues conforme cada medidor termina.
+#As funções síncronas de medidorSaga1000.py são apenas invólucros sobre este módulo.
+import asyncio
+import logging
+import random
+import socket
+import time
+from collections import namedtuple
+
+import codec14522
+import instrumentacao
+from codec14522 import ENQ, ACK, NAK, WAIT, ALO
+from leitor_quadros import LeitorQuadros
+
+PORTA_UDP_ATIVACAO = 65535
+MENSAGEM_ATIVACAO = bytes.fromhex("020121c03803")
+
+logger = logging.getLogger('saga1000.motor')
+
+# Medidor a ser consultado: IP, porta TCP e comando já montado (ex.: montar_comando_14)
+Medidor = namedtuple('Medidor', 'ip porta mensagem')
+
+# Resultado de um medidor: resposta válida (ou None), erro (ou None) e duração em segundos
+ResultadoMedidor = namedtuple('ResultadoMedidor', 'medidor resposta erro duracao')
+
+
+# Recuo exponencial com jitter: atraso(n) = min(maximo, base * fator ** (n - 1)), reduzido aleatoriamente
+# em até 'jitter' (fração) para que medidores atrás do mesmo gateway não tentem de novo ao mesmo tempo
+class Recuo:
+    def __init__(self, base=0.5, fator=2.0, maximo=30.0, jitter=0.5, aleatorio=None):
+        self.base = base
+        self.fator = fator
+        self.maximo = maximo
+        self.jitter = jitter
+        self._aleatorio = aleatorio or random.Random()
+
+    def atraso(self, tentativa: int) -> float:
+        atraso = min(self.maximo, self.base * self.fator ** max(0, tentativa - 1))
+        return atraso * (1.0 - self.jitter * self._aleatorio.random())
+
+
+# Função que calcula quanto tempo ainda resta até o prazo, limitado pelo timeout da etapa
+def _restante(loop, limite, timeout):
+    if limite is None:
+        return timeout
+    falta = max(0.0, limite - loop.time())
+    return falta if timeout is None else min(timeout, falta)
+
+
+# Função que envia os pacotes UDP de ativação sem bloquear o loop durante o intervalo entre eles
+async def ativar_udp(ip_destino, num_tentativas=3, intervalo=1.0):
+    inst = instrumentacao.atual()
+    inicio = time.perf_counter()
+    logger.info("enviando %d pacotes UDP de ativação", num_tentativas,
+                extra={'medidor': ip_destino, 'porta_udp': PORTA_UDP_ATIVACAO})
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp_sock:
+        udp_sock.setblocking(False)
+        for i in range(num_tentativas):
+            try:
+                udp_sock.sendto(MENSAGEM_ATIVACAO, (ip_destino, PORTA_UDP_ATIVACAO))
+                logger.debug("pacote UDP %d/%d enviado", i + 1, num_tentativas, extra={'medidor': ip_destino})
+                await asyncio.sleep(intervalo)
+            except OSError as e:
+                logger.warning("erro ao enviar UDP: %s", e, extra={'medidor': ip_destino})
+    if inst is not None:
+        inst.observar(ip_destino, 'ativacao_udp', time.perf_counter() - inicio)
+
+
+# Função que aguarda o byte ENQ do medidor; retorna False em timeout ou conexão encerrada
+# Os bytes que chegarem depois do ENQ ficam no leitor para a próxima etapa
+async def esperar_enq(sock, timeout=20, leitor=None):
+    loop = asyncio.get_running_loop()
+    leitor = leitor if leitor is not None else LeitorQuadros()
+    limite = None if timeout is None else loop.time() + timeout
+    try:
+        while not leitor.consumir_ate(ENQ):
+            if not await asyncio.wait_for(leitor.preencher_async(sock), _restante(loop, limite, None)):
+                return False
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+# Função que lê o próximo quadro do medidor (byte de controle ou resposta completa), juntando leituras parciais.
+# Em timeout, devolve o que chegou até então (ou None se nada chegou); b'' indica conexão encerrada
+async def ler_quadro(sock, leitor, timeout):
+    loop = asyncio.get_running_loop()
+    limite = None if timeout is None else loop.time() + timeout
+    try:
+        while True:
+            quadro = leitor.proximo_quadro()
+            if quadro is not None:
+                return bytes(quadro)
+            if not await asyncio.wait_for(leitor.preencher_async(sock), _restante(loop, limite, None)):
+                return bytes(leitor.consumir_pendente())
+    except asyncio.TimeoutError:
+        return bytes(leitor.consumir_pendente()) or None
+
+
+# Função que executa uma transação completa (ALO, ENQ, comando, resposta) em um socket já conectado e não bloqueante
+# prazo: tempo total em segundos para o medidor responder (None = sem prazo, limitado só pelos contadores)
+# max_tentativas/max_naks/max_waits: limites opcionais, usados pelos invólucros síncronos
+# recuo: Recuo aplicado antes de reenviar depois de WAIT/NAK (None = reenvia imediatamente)
+# rotulo: identificação do medidor nas métricas e no log (ex.: número de série); padrão 'ip:porta', que
+# agrupa todos os medidores atrás do mesmo gateway
+# Com a instrumentação ativa (instrumentacao.ativar()), cada fase é cronometrada e cada desfecho contado por medidor;
+# desligada, o custo é uma comparação com None por etapa. As mensagens de acompanhamento vão para o logger
+# 'saga1000.motor' (nível DEBUG para as etapas, WARNING para WAIT/NAK/CRC inválido/timeout)
+async def transacao(sock, mensagem, prazo=None, timeout_enq=20.0, max_alo=5,
+                    max_tentativas=None, max_naks=None, max_waits=None,
+                    reativar=True, diagnostico=None, leitor=None, recuo=None, rotulo=None):
+    loop = asyncio.get_running_loop()
+    leitor = leitor if leitor is not None else LeitorQuadros()
+    limite = None if prazo is None else loop.time() + prazo
+    nak_count = 0
+    wait_count = 0
+    tentativas = 0
+    ip_destino, porta = sock.getpeername()[:2]
+    inst = instrumentacao.atual()
+    depurar = logger.isEnabledFor(logging.DEBUG)
+    rotulo = rotulo or f"{ip_destino}:{porta}"
+    extra = {'medidor': rotulo, 'gateway': f"{ip_destino}:{porta}"}
+    while max_tentativas is None or tentativas < max_tentativas:
+        if limite is not None and loop.time() >= limite:
+            logger.warning("prazo do medidor esgotado", extra=extra)
+            if inst is not None:
+                inst.contar(rotulo, 'timeout')
+            break
+        if depurar:
+            logger.debug("enviando ALO", extra=extra)
+        if inst is not None:
+            inicio = time.perf_counter()
+        await loop.sock_sendall(sock, bytes([ALO]) * max_alo)
+        if inst is not None:
+            agora = time.perf_counter()
+            inst.observar(rotulo, 'envio_alo', agora - inicio)
+            inicio = agora
+        recebeu_enq = await esperar_enq(sock, _restante(loop, limite, timeout_enq), leitor)
+        if inst is not None:
+            inst.observar(rotulo, 'espera_enq', time.perf_counter() - inicio)
+        if not recebeu_enq:
+            logger.warning("timeout aguardando ENQ, comando não enviado", extra=extra)
+            if inst is not None:
+                inst.contar(rotulo, 'timeout')
+            tentativas += 1
+            continue
+        if depurar:
+            logger.debug("ENQ recebido, enviando comando", extra=extra)
+        if inst is not None:
+            inicio = time.perf_counter()
+        await loop.sock_sendall(sock, mensagem)
+        if inst is not None:
+            agora = time.perf_counter()
+            inst.observar(rotulo, 'envio_comando', agora - inicio)
+            inicio = agora
+        resposta = await ler_quadro(sock, leitor, _restante(loop, limite, timeout_enq))
+        if inst is not None:
+            inst.observar(rotulo, 'recepcao_resposta', time.perf_counter() - inicio)
+        if resposta is None:
+            logger.warning("timeout ao receber resposta", extra=extra)
+            if inst is not None:
+                inst.contar(rotulo, 'timeout')
+            tentativas += 1
+            continue
+        if not resposta:
+            logger.warning("nenhuma resposta recebida", extra=extra)
+            tentativas += 1
+            continue
+        if depurar:
+            logger.debug("resposta recebida (hex): %s", resposta.hex().upper(), extra=extra)
+        primeiro_byte = resposta[0]
+        if primeiro_byte == WAIT:
+            wait_count += 1
+            logger.warning("WAIT recebido (%d), aguardando ENQ para reenviar comando", wait_count, extra=extra)
+            if inst is not None:
+                inst.contar(rotulo, 'wait')
+            if max_waits is not None and wait_count > max_waits:
+                logger.warning("número máximo de WAITs atingido, abortando", extra=extra)
+                break
+            if recuo is not None:
+                await asyncio.sleep(_restante(loop, limite, recuo.atraso(wait_count)))
+            continue
+        elif primeiro_byte == NAK:
+            nak_count += 1
+            logger.warning("NAK recebido (%d), reenviando comando", nak_count, extra=extra)
+            if inst is not None:
+                inst.contar(rotulo, 'nak')
+            if max_naks is not None and nak_count > max_naks:
+                logger.warning("número máximo de NAKs atingido, abortando", extra=extra)
+                break
+            if recuo is not None:
+                await asyncio.sleep(_restante(loop, limite, recuo.atraso(nak_count)))
+            continue
+        elif primeiro_byte == ENQ:
+            logger.debug("ENQ inesperado recebido, reenviando comando", extra=extra)
+            continue
+        elif primeiro_byte == ACK:
+            logger.debug("ACK inesperado recebido, aguardando resposta", extra=extra)
+            continue
+        if inst is not None:
+            inicio = time.perf_counter()
+        valido = codec14522.validar_quadro(resposta)
+        if inst is not None:
+            inst.observar(rotulo, 'verificacao_crc', time.perf_counter() - inicio)
+        if valido:
+            if depurar:
+                logger.debug("CRC válido na resposta, enviando ACK", extra=extra)
+            await loop.sock_sendall(sock, bytes([ACK]))
+            if inst is not None:
+                inst.contar(rotulo, 'sucesso')
+            return resposta
+        logger.warning("CRC inválido na resposta", extra=extra)
+        if inst is not None:
+            inst.contar(rotulo, 'crc_invalido')
+        if diagnostico is not None:
+            diagnostico(resposta)
+        await loop.sock_sendall(sock, bytes([NAK]))
+        nak_count += 1
+        if max_naks is not None and nak_count > max_naks:
+            logger.warning("número máximo de NAKs atingido, abortando", extra=extra)
+            break
+        if reativar:
+            logger.info("reenviando pacotes de ativação UDP antes de nova tentativa", extra=extra)
+            await ativar_udp(ip_destino)
+    logger.info("comunicação finalizada sem resposta válida", extra=extra)
+    if inst is not None:
+        inst.contar(rotulo, 'falha')
+    return None
+
+
+# Função que consulta um único medidor: ativação UDP, conexão TCP e transação, tudo dentro do prazo.
+# Com um GerenciadorSessoes (sessoes.py), a conexão e a ativação são reaproveitadas entre consultas
+async def consultar_medidor(medidor, prazo=60.0, timeout_conexao=5.0, ativar=True, sessoes=None, **opcoes):
+    loop = asyncio.get_running_loop()
+    inicio = time.monotonic()
+    limite = loop.time() + prazo
+    if sessoes is not None:
+        try:
+            resposta = await asyncio.wait_for(
+                sessoes.executar(medidor.ip, medidor.porta, medidor.mensagem, prazo=prazo, **opcoes), prazo)
+        except (OSError, asyncio.TimeoutError) as e:
+            sessoes.fechar(medidor.ip, medidor.porta)
+            return ResultadoMedidor(medidor, None, repr(e), time.monotonic() - inicio)
+        erro = None if resposta is not None else "sem resposta válida dentro do prazo"
+        return ResultadoMedidor(medidor, resposta, erro, time.monotonic() - inicio)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    try:
+        if ativar:
+            await ativar_udp(medidor.ip)
+        await asyncio.wait_for(loop.sock_connect(sock, (medidor.ip, medidor.porta)),
+                               _restante(loop, limite, timeout_conexao))
+        resposta = await transacao(sock, medidor.mensagem, prazo=_restante(loop, limite, None), **opcoes)
+        erro = None if resposta is not None else "sem resposta válida dentro do prazo"
+        return ResultadoMedidor(medidor, resposta, erro, time.monotonic() - inicio)
+    except (OSError, asyncio.TimeoutError) as e:
+        return ResultadoMedidor(medidor, None, repr(e), time.monotonic() - inicio)
+    finally:
+        sock.close()
+
+
+# Função que consulta vários medidores em paralelo (até 'concorrencia' ao mesmo tempo)
+# e entrega cada ResultadoMedidor assim que aquele medidor termina (iterador assíncrono)
+async def consultar_frota(medidores, concorrencia=50, prazo=60.0, **opcoes):
+    fila_medidores = iter(medidores)
+    resultados = asyncio.Queue()
+
+    async def trabalhador():
+        for medidor in fila_medidores:
+            await resultados.put(await consultar_medidor(medidor, prazo=prazo, **opcoes))
+
+    trabalhadores = [asyncio.ensure_future(trabalhador()) for _ in range(max(1, concorrencia))]
+    ativos = len(trabalhadores)
+    for tarefa in trabalhadores:
+        tarefa.add_done_callback(lambda _: resultados.put_nowait(None))
+    try:
+        while ativos:
+            resultado = await resultados.get()
+            if resultado is None:
+                ativos -= 1
+                continue
+            yield resultado
+    finally:
+        for tarefa in trabalhadores:
+            tarefa.cancel()
+    for tarefa in trabalhadores:
+        if tarefa.exception() is not None:
+            raise tarefa.exception()
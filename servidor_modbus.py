@@ -0,0 +1,196 @@
+#servidor_modbus.py
+
+#Gateway Modbus TCP para os medidores Saga 1000
+#Um agendador (agendador.py) lê os medidores em segundo plano pelo mesmo caminho de enviar_comando/Float24 e grava
+#os valores decodificados em um datastore de registradores em memória (pymodbus 2.5.3). Os clientes Modbus (SCADA)
+#são atendidos a partir desse cache, sem ida ao medidor.
+#Mapa de registradores (holding e input, FC3/FC4, endereços a partir de 0): cada medidor ocupa um bloco em uma
+#unidade (unit id); cada grandeza usa 4 registradores: valor float32 (2 registradores, big-endian) seguido do
+#instante da leitura em segundos desde a época (uint32, 2 registradores), que indica se o valor está desatualizado.
+#Uso: python servidor_modbus.py inventario.json --porta-modbus 5020 --alvo 60
+import argparse
+import asyncio
+import logging
+import struct
+import threading
+import time
+from collections import namedtuple
+
+from pymodbus.datastore import ModbusSequentialDataBlock, ModbusServerContext, ModbusSlaveContext
+from pymodbus.server.sync import ModbusTcpServer
+
+import agendador
+import float24
+
+REGISTROS_POR_GRANDEZA = 4
+_VALOR_E_INSTANTE = struct.Struct('>fI')
+_REGISTROS = struct.Struct('>4H')
+# Pausa antes de reiniciar o polling depois de um erro inesperado no agendador
+ESPERA_REINICIO = 5.0
+
+logger = logging.getLogger('saga1000.modbus')
+
+# Posição de uma grandeza de um medidor no mapa Modbus
+EnderecoGrandeza = namedtuple('EnderecoGrandeza', 'numero_serie grandeza unidade endereco')
+
+
+class CacheModbus:
+    # grandezas: índices dos valores do campo do layout expostos por medidor (padrão: todos)
+    def __init__(self, numeros_serie, comando=0x14, grandezas=None, primeira_unidade=1):
+        self.comando = comando
+        self.layout = float24.layout_do_comando(comando)
+        quantidade = sum(campo.quantidade for campo in self.layout)
+        self.grandezas = list(range(quantidade)) if grandezas is None else list(grandezas)
+        invalidas = [indice for indice in self.grandezas if not 0 <= indice < quantidade]
+        if invalidas or not self.grandezas:
+            raise ValueError(f"grandezas fora do layout do comando 0x{comando:02X} (0 a {quantidade - 1}): {invalidas}")
+        self.registros_por_medidor = REGISTROS_POR_GRANDEZA * len(self.grandezas)
+        self.medidores_por_unidade = max(1, 65536 // self.registros_por_medidor)
+        self._posicoes = {}
+        blocos = {}
+        for indice, numero_serie in enumerate(dict.fromkeys(numeros_serie)):
+            unidade = primeira_unidade + indice // self.medidores_por_unidade
+            if unidade > 247:
+                raise ValueError("inventário não cabe nas unidades Modbus disponíveis")
+            if unidade not in blocos:
+                blocos[unidade] = ModbusSequentialDataBlock(0, [0] * (self.medidores_por_unidade * self.registros_por_medidor))
+            base = (indice % self.medidores_por_unidade) * self.registros_por_medidor
+            self._posicoes[numero_serie] = (blocos[unidade], unidade, base)
+        self.contexto = ModbusServerContext(slaves={
+            unidade: ModbusSlaveContext(hr=bloco, ir=bloco, zero_mode=True) for unidade, bloco in blocos.items()
+        }, single=False)
+        self.atualizacoes = 0
+
+    # Função que decodifica a resposta e grava valores e instante no bloco do medidor (uma única atribuição)
+    def atualizar(self, numero_serie, resposta, instante=None):
+        posicao = self._posicoes.get(numero_serie)
+        if posicao is None:
+            return False
+        bloco, _, base = posicao
+        colunas = float24.decodificar_lote(resposta, self.layout)
+        colunas.pop('numero_serie')
+        valores = [valor for coluna in colunas.values() for valor in coluna]
+        if not valores:
+            return False
+        instante = int(time.time() if instante is None else instante) & 0xFFFFFFFF
+        registros = []
+        for indice in self.grandezas:
+            registros.extend(_REGISTROS.unpack(_VALOR_E_INSTANTE.pack(valores[indice], instante)))
+        bloco.setValues(base, registros)
+        self.atualizacoes += 1
+        return True
+
+    # Função usada como ao_ler do agendador; um erro em uma leitura é registrado e não interrompe o polling
+    def ao_ler(self, item, comando, resposta):
+        if comando != self.comando:
+            return
+        try:
+            self.atualizar(item.numero_serie, resposta)
+        except Exception:
+            logger.exception("falha ao atualizar o cache Modbus", extra={'medidor': f"{item.numero_serie:06X}"})
+
+    # Função que lista onde cada grandeza de cada medidor está no mapa Modbus
+    def mapa(self) -> list:
+        enderecos = []
+        for numero_serie, (_, unidade, base) in self._posicoes.items():
+            for posicao, grandeza in enumerate(self.grandezas):
+                enderecos.append(EnderecoGrandeza(numero_serie, grandeza, unidade,
+                                                  base + REGISTROS_POR_GRANDEZA * posicao))
+        return enderecos
+
+
+# Função que converte os 4 registradores de uma grandeza em (valor, instante da leitura)
+def decodificar_registros(registros):
+    return _VALOR_E_INSTANTE.unpack(_REGISTROS.pack(*registros))
+
+
+class ServidorModbus:
+    def __init__(self, inventario, endereco=('0.0.0.0', 5020), comando=0x14, grandezas=None, **opcoes_agendador):
+        self.cache = CacheModbus([item.numero_serie for item in inventario], comando, grandezas)
+        self.agendador = agendador.Agendador(inventario, ao_ler=self.cache.ao_ler, **opcoes_agendador)
+        self.servidor = ModbusTcpServer(self.cache.contexto, address=endereco, allow_reuse_address=True)
+        self._loop = None
+        self._parando = threading.Event()
+        self._threads = []
+
+    # Função da thread de polling: se o agendador parar por um erro inesperado, registra e reinicia após uma pausa
+    def _executar_agendador(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            while not self._parando.is_set():
+                try:
+                    self._loop.run_until_complete(self.agendador.executar())
+                    break
+                except asyncio.CancelledError:
+                    break
+                except Exception:
+                    logger.exception("agendador interrompido por erro; reiniciando em %.1f s", ESPERA_REINICIO)
+                    self._loop.run_until_complete(asyncio.sleep(ESPERA_REINICIO))
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.agendador.gerenciador.fechar_todas()
+            self._loop.close()
+
+    # Função que inicia o servidor Modbus e, se 'polling' for True, o agendador em segundo plano
+    def iniciar(self, polling=True):
+        alvos = [self.servidor.serve_forever]
+        if polling:
+            alvos.append(self._executar_agendador)
+        for alvo in alvos:
+            thread = threading.Thread(target=alvo, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def parar(self):
+        self._parando.set()
+        if self._loop is not None and self._loop.is_running():
+            for tarefa in asyncio.all_tasks(self._loop):
+                self._loop.call_soon_threadsafe(tarefa.cancel)
+        self.servidor.shutdown()
+        self.servidor.server_close()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+
+# Conversor do argumento --grandezas: lista de índices separados por vírgula (ex.: 0,1,2)
+def _lista_grandezas(texto) -> list:
+    itens = [item.strip() for item in texto.split(',')]
+    if not all(item.isdigit() for item in itens):
+        raise argparse.ArgumentTypeError(f"esperada lista de índices inteiros separados por vírgula: {texto!r}")
+    return [int(item) for item in itens]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gateway Modbus TCP para medidores Saga 1000")
+    parser.add_argument('inventario', help="arquivo JSON com a lista de medidores (mesmo formato do agendador)")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--porta-modbus', type=int, default=5020)
+    parser.add_argument('--alvo', type=float, default=60.0, help="duração alvo do ciclo de polling em segundos")
+    parser.add_argument('--grandezas', type=_lista_grandezas, default=None, help="índices dos valores expostos, ex.: 0,1,2 (padrão: todos)")
+    agendador.adicionar_opcoes_observabilidade(parser)
+    args = parser.parse_args()
+
+    try:
+        servidor = ServidorModbus(agendador.carregar_inventario(args.inventario), (args.host, args.porta_modbus),
+                                  grandezas=args.grandezas, duracao_alvo=args.alvo)
+    except ValueError as e:
+        parser.error(str(e))
+    for endereco in servidor.cache.mapa()[:10]:
+        print(f"medidor {endereco.numero_serie:06X} grandeza {endereco.grandeza}: "
+              f"unidade {endereco.unidade}, registrador {endereco.endereco}")
+    print(f"\n🛰️ Servidor Modbus TCP em {args.host}:{args.porta_modbus} "
+          f"({servidor.cache.registros_por_medidor} registradores por medidor)\n")
+    exportador = agendador.iniciar_observabilidade(args)
+    servidor.iniciar()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        servidor.parar()
+        if exportador is not None:
+            exportador.parar()
+
+
+if __name__ == "__main__":
+    main()
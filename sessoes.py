@@ -0,0 +1,157 @@
+#sessoes.py
+
+#Gerenciador de sessões com os medidores Saga 1000 / gateways RS-232
+#Guarda, por IP, quando o medidor foi ativado via UDP (com TTL) e mantém a conexão TCP aberta entre comandos,
+#verificando de forma barata se ela continua viva. A ativação UDP (3 pacotes com 1 s de intervalo) e a
+#reconexão só são refeitas quando a sessão realmente morreu. Contadores mostram quanto foi economizado.
+import asyncio
+import logging
+import socket
+import time
+
+import motor_assincrono
+from leitor_quadros import LeitorQuadros
+
+logger = logging.getLogger('saga1000.sessoes')
+
+
+# Sessão TCP aberta com um medidor/gateway: socket não bloqueante e leitor de quadros com o que ficou pendente
+class Sessao:
+    def __init__(self, ip, porta, sock):
+        self.ip = ip
+        self.porta = porta
+        self.sock = sock
+        self.leitor = LeitorQuadros()
+        self.ultimo_uso = time.monotonic()
+
+    # Função que verifica, sem bloquear e sem consumir dados, se o outro lado ainda não fechou a conexão
+    def viva(self) -> bool:
+        if self.sock.fileno() < 0:
+            return False
+        try:
+            return bool(self.sock.recv(1, socket.MSG_PEEK))
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+
+    def fechar(self):
+        self.sock.close()
+
+
+class GerenciadorSessoes:
+    def __init__(self, ttl_ativacao=60.0, timeout_conexao=5.0):
+        self.ttl_ativacao = ttl_ativacao
+        self.timeout_conexao = timeout_conexao
+        self._ativados = {}
+        self._sessoes = {}
+        self._travas = {}
+        self._ativando = {}
+        self.ativacoes = 0
+        self.ativacoes_evitadas = 0
+        self.conexoes = 0
+        self.conexoes_evitadas = 0
+        self.sessoes_mortas = 0
+
+    # Função que informa se a última ativação UDP do IP ainda está dentro do TTL
+    def ativado(self, ip) -> bool:
+        ativado_em = self._ativados.get(ip)
+        return ativado_em is not None and time.monotonic() - ativado_em < self.ttl_ativacao
+
+    # Função que esquece a ativação do IP, forçando uma nova ativação UDP na próxima conexão
+    def invalidar(self, ip):
+        self._ativados.pop(ip, None)
+
+    # Função que envia a ativação UDP somente se o IP não estiver ativado; chamadas simultâneas para o
+    # mesmo IP (várias portas do mesmo gateway) aguardam a mesma ativação
+    async def ativar(self, ip):
+        if self.ativado(ip):
+            self.ativacoes_evitadas += 1
+            return
+        tarefa = self._ativando.get(ip)
+        if tarefa is not None:
+            self.ativacoes_evitadas += 1
+            await asyncio.shield(tarefa)
+            return
+        tarefa = self._ativando[ip] = asyncio.ensure_future(motor_assincrono.ativar_udp(ip))
+        try:
+            await asyncio.shield(tarefa)
+        finally:
+            self._ativando.pop(ip, None)
+        self._ativados[ip] = time.monotonic()
+        self.ativacoes += 1
+
+    # Função que retorna uma sessão viva para o medidor, reaproveitando a conexão aberta quando possível
+    async def obter(self, ip, porta) -> Sessao:
+        sessao = self._sessoes.get((ip, porta))
+        if sessao is not None:
+            if sessao.viva():
+                self.conexoes_evitadas += 1
+                self.ativacoes_evitadas += 1
+                return sessao
+            logger.info("sessão encerrada pelo medidor, reconectando", extra={'medidor': f"{ip}:{porta}"})
+            self.sessoes_mortas += 1
+            self.fechar(ip, porta)
+        await self.ativar(ip)
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        try:
+            await asyncio.wait_for(loop.sock_connect(sock, (ip, porta)), self.timeout_conexao)
+        except BaseException:
+            sock.close()
+            self.invalidar(ip)
+            raise
+        self.conexoes += 1
+        logger.info("conectado ao medidor", extra={'medidor': f"{ip}:{porta}"})
+        sessao = self._sessoes[(ip, porta)] = Sessao(ip, porta, sock)
+        return sessao
+
+    # Função que executa um comando pela sessão do medidor; se a transação falhar, a sessão é descartada
+    # e a próxima chamada refaz a ativação UDP e a conexão. Comandos para o mesmo medidor são serializados.
+    # 'rotulo' identifica o medidor nas métricas e no log quando vários compartilham o mesmo gateway
+    async def executar(self, ip, porta, mensagem, rotulo=None, **opcoes):
+        opcoes.setdefault('reativar', False)
+        trava = self._travas.setdefault((ip, porta), asyncio.Lock())
+        async with trava:
+            sessao = await self.obter(ip, porta)
+            try:
+                resposta = await motor_assincrono.transacao(sessao.sock, mensagem, leitor=sessao.leitor,
+                                                           rotulo=rotulo, **opcoes)
+            except OSError:
+                resposta = None
+            sessao.ultimo_uso = time.monotonic()
+            if resposta is None:
+                self.fechar(ip, porta)
+                self.invalidar(ip)
+            else:
+                self._ativados[ip] = sessao.ultimo_uso
+        return resposta
+
+    def fechar(self, ip, porta):
+        sessao = self._sessoes.pop((ip, porta), None)
+        if sessao is not None:
+            sessao.fechar()
+
+    def fechar_todas(self):
+        for ip, porta in list(self._sessoes):
+            self.fechar(ip, porta)
+
+    # Função que retorna os contadores de ativações/conexões feitas e evitadas
+    def estatisticas(self) -> dict:
+        return {
+            'ativacoes': self.ativacoes,
+            'ativacoes_evitadas': self.ativacoes_evitadas,
+            'conexoes': self.conexoes,
+            'conexoes_evitadas': self.conexoes_evitadas,
+            'sessoes_mortas': self.sessoes_mortas,
+            'sessoes_abertas': len(self._sessoes),
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar_todas()
@@ -0,0 +1,243 @@
+#simulador.py
+
+#Simulador local de medidores Saga 1000 (lado do medidor do protocolo ABNT NBR 14522)
+#Escuta em TCP (uma ou várias portas, cada porta faz o papel de um gateway RS-232) e na porta UDP de ativação 65535.
+#Responde ALO com ENQ, recebe o comando 14 ou um comando genérico, confere o CRC e devolve uma resposta de 258 bytes
+#com CRC correto e valores Float24. Atrás de cada porta podem existir vários medidores virtuais (um por número de série).
+#Permite configurar latência e injetar WAIT, NAK, lixo e respostas fragmentadas, para testes de carga e benchmarks.
+#Uso: python simulador.py --porta 5000 --portas 10 --latencia 0.005 --prob-wait 0.02
+import argparse
+import asyncio
+import random
+import threading
+import time
+
+import codec14522
+import float24
+from codec14522 import ENQ, ACK, NAK, WAIT, ALO, TAMANHO_COMANDO, TAMANHO_RESPOSTA
+
+PORTA_UDP_ATIVACAO = 65535
+VALORES_POR_RESPOSTA = (TAMANHO_RESPOSTA - 2 - 4) // 3
+
+
+# Medidor virtual: número de série e registradores que avançam a cada leitura
+class MedidorVirtual:
+    def __init__(self, numero_serie, semente=None):
+        self.numero_serie = numero_serie & 0xFFFFFF
+        self._aleatorio = random.Random(numero_serie if semente is None else semente)
+        self.registradores = [self._aleatorio.uniform(0.0, 1000.0) for _ in range(VALORES_POR_RESPOSTA)]
+        self.leituras = 0
+
+    # Função que monta os 256 bytes de dados da resposta: código, número de série e valores Float24
+    def dados_resposta(self, codigo):
+        self.leituras += 1
+        self.registradores = [valor + self._aleatorio.uniform(0.0, 0.5) for valor in self.registradores]
+        dados = bytearray(TAMANHO_RESPOSTA - 2)
+        dados[0] = codigo
+        dados[1:4] = self.numero_serie.to_bytes(3, 'big')
+        dados[4:4 + 3 * VALORES_POR_RESPOSTA] = float24.codificar_float24(self.registradores)
+        return dados
+
+
+class Simulador:
+    def __init__(self, host='127.0.0.1', porta=5000, portas=1, porta_udp=PORTA_UDP_ATIVACAO,
+                 latencia=0.0, jitter=0.0, prob_wait=0.0, prob_nak=0.0, prob_lixo=0.0,
+                 prob_fragmentar=0.0, exigir_ativacao=False, ttl_ativacao=60.0,
+                 complementar_resposta=False, semente=None):
+        self.host = host
+        self.porta = porta
+        self.portas = portas
+        self.porta_udp = porta_udp
+        self.latencia = latencia
+        self.jitter = jitter
+        self.prob_wait = prob_wait
+        self.prob_nak = prob_nak
+        self.prob_lixo = prob_lixo
+        self.prob_fragmentar = prob_fragmentar
+        self.exigir_ativacao = exigir_ativacao
+        self.ttl_ativacao = ttl_ativacao
+        # Quando True, a resposta inteira (dados + CRC) é complementada como os comandos enviados pelo cliente
+        self.complementar_resposta = complementar_resposta
+        self._aleatorio = random.Random(semente)
+        self.medidores = {}
+        self._ativados = {}
+        self._servidores = []
+        self._transporte_udp = None
+        self.contadores = dict.fromkeys(
+            ('conexoes', 'ativacoes', 'transacoes', 'waits', 'naks', 'lixo', 'fragmentadas',
+             'comandos_crc_invalido', 'acks', 'naks_recebidos'), 0)
+
+    # Função que retorna (criando se preciso) o medidor virtual com o número de série informado
+    def medidor(self, numero_serie):
+        medidor = self.medidores.get(numero_serie)
+        if medidor is None:
+            medidor = self.medidores[numero_serie] = MedidorVirtual(numero_serie)
+        return medidor
+
+    async def _esperar(self):
+        atraso = self.latencia + (self._aleatorio.uniform(0.0, self.jitter) if self.jitter else 0.0)
+        if atraso > 0:
+            await asyncio.sleep(atraso)
+
+    def _ativado(self, ip):
+        ativado_em = self._ativados.get(ip)
+        return ativado_em is not None and time.monotonic() - ativado_em < self.ttl_ativacao
+
+    # Função que lê o comando depois do ENQ: comando genérico (ENQ + 5 bytes) ou quadro de 66 bytes
+    async def _ler_comando(self, reader):
+        primeiro = (await reader.readexactly(1))[0]
+        while primeiro == ALO:
+            primeiro = (await reader.readexactly(1))[0]
+        if primeiro == ENQ:
+            return await reader.readexactly(5)
+        return bytes([primeiro]) + await reader.readexactly(TAMANHO_COMANDO - 1)
+
+    # Função que monta a resposta (dados + CRC) ao comando já descomplementado
+    def _resposta(self, comando, serie_padrao):
+        codigo = comando[0]
+        if codigo == 0x14 and len(comando) >= 4:
+            serie = int.from_bytes(comando[1:4], 'big')
+        else:
+            serie = serie_padrao
+        dados = self.medidor(serie).dados_resposta(codigo)
+        if self.complementar_resposta:
+            return codec14522.codificar_quadro(dados)
+        return bytes(dados) + codec14522.CRC16(dados).digest()
+
+    async def _enviar_resposta(self, writer, resposta):
+        if self.prob_fragmentar and self._aleatorio.random() < self.prob_fragmentar:
+            self.contadores['fragmentadas'] += 1
+            corte = self._aleatorio.randrange(1, len(resposta))
+            writer.write(resposta[:corte])
+            await writer.drain()
+            await asyncio.sleep(0.001)
+            writer.write(resposta[corte:])
+        else:
+            writer.write(resposta)
+        await writer.drain()
+
+    # Função que atende uma conexão TCP fazendo o papel do medidor: ALO -> ENQ -> comando -> resposta -> ACK/NAK
+    async def _atender(self, reader, writer, serie_padrao):
+        self.contadores['conexoes'] += 1
+        ip = writer.get_extra_info('peername')[0]
+        try:
+            while True:
+                byte = (await reader.readexactly(1))[0]
+                if byte == ACK:
+                    self.contadores['acks'] += 1
+                    continue
+                if byte == NAK:
+                    self.contadores['naks_recebidos'] += 1
+                    continue
+                if byte != ALO or (self.exigir_ativacao and not self._ativado(ip)):
+                    continue
+                await self._esperar()
+                writer.write(bytes([ENQ]))
+                await writer.drain()
+                comando = codec14522.complementar(await self._ler_comando(reader))
+                await self._esperar()
+                sorteio = self._aleatorio.random()
+                if not codec14522.validar_quadro(comando):
+                    self.contadores['comandos_crc_invalido'] += 1
+                    writer.write(bytes([NAK]))
+                elif sorteio < self.prob_wait:
+                    self.contadores['waits'] += 1
+                    writer.write(bytes([WAIT]))
+                elif sorteio < self.prob_wait + self.prob_nak:
+                    self.contadores['naks'] += 1
+                    writer.write(bytes([NAK]))
+                elif sorteio < self.prob_wait + self.prob_nak + self.prob_lixo:
+                    self.contadores['lixo'] += 1
+                    writer.write(bytes(self._aleatorio.getrandbits(8) | 0x80 for _ in range(TAMANHO_RESPOSTA)))
+                else:
+                    self.contadores['transacoes'] += 1
+                    await self._enviar_resposta(writer, self._resposta(comando, serie_padrao))
+                    continue
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def iniciar(self):
+        loop = asyncio.get_running_loop()
+        for i in range(self.portas):
+            serie_padrao = (self.porta + i) & 0xFFFFFF
+            servidor = await asyncio.start_server(
+                lambda r, w, serie=serie_padrao: self._atender(r, w, serie), self.host, self.porta + i)
+            self._servidores.append(servidor)
+        if self.porta_udp:
+            simulador = self
+
+            class _ProtocoloAtivacao(asyncio.DatagramProtocol):
+                def datagram_received(self, dados, endereco):
+                    simulador.contadores['ativacoes'] += 1
+                    simulador._ativados[endereco[0]] = time.monotonic()
+
+            self._transporte_udp, _ = await loop.create_datagram_endpoint(
+                _ProtocoloAtivacao, local_addr=(self.host, self.porta_udp))
+
+    async def fechar(self):
+        for servidor in self._servidores:
+            servidor.close()
+            await servidor.wait_closed()
+        self._servidores = []
+        if self._transporte_udp is not None:
+            self._transporte_udp.close()
+            self._transporte_udp = None
+
+    async def executar(self):
+        await self.iniciar()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.fechar()
+
+    # Função que inicia o simulador em uma thread separada (útil em benchmarks no mesmo processo)
+    def iniciar_em_thread(self):
+        pronto = threading.Event()
+        loop = asyncio.new_event_loop()
+
+        def rodar():
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.iniciar())
+            pronto.set()
+            loop.run_forever()
+
+        threading.Thread(target=rodar, daemon=True).start()
+        pronto.wait()
+        return loop
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador de medidores Saga 1000 (NBR 14522)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=5000, help="primeira porta TCP")
+    parser.add_argument('--portas', type=int, default=1, help="quantidade de portas TCP (gateways)")
+    parser.add_argument('--porta-udp', type=int, default=PORTA_UDP_ATIVACAO, help="0 desativa o UDP")
+    parser.add_argument('--latencia', type=float, default=0.0, help="atraso em segundos antes do ENQ e da resposta")
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--prob-wait', type=float, default=0.0)
+    parser.add_argument('--prob-nak', type=float, default=0.0)
+    parser.add_argument('--prob-lixo', type=float, default=0.0)
+    parser.add_argument('--prob-fragmentar', type=float, default=0.0)
+    parser.add_argument('--exigir-ativacao', action='store_true')
+    parser.add_argument('--complementar-resposta', action='store_true')
+    parser.add_argument('--semente', type=int, default=None)
+    args = parser.parse_args()
+    simulador = Simulador(
+        host=args.host, porta=args.porta, portas=args.portas, porta_udp=args.porta_udp,
+        latencia=args.latencia, jitter=args.jitter, prob_wait=args.prob_wait, prob_nak=args.prob_nak,
+        prob_lixo=args.prob_lixo, prob_fragmentar=args.prob_fragmentar,
+        exigir_ativacao=args.exigir_ativacao, complementar_resposta=args.complementar_resposta,
+        semente=args.semente)
+    print(f"\n🧪 Simulador ouvindo em {args.host}:{args.porta}-{args.porta + args.portas - 1} "
+          f"(UDP {args.porta_udp or 'desativado'})\n")
+    try:
+        asyncio.run(simulador.executar())
+    except KeyboardInterrupt:
+        print(f"\n📊 {simulador.contadores}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import asyncio
+import socket
+import tempfile
+import time
+import unittest
+
+import sessoes
+from agendador import Agendador, ItemInventario
+from armazenamento import ArmazenamentoLeituras
+from motor_assincrono import Recuo
+from simulador import Simulador
+
+
+# Gerenciador sem a ativação UDP (3 pacotes com 1 s de intervalo); o simulador não a exige
+class _SemAtivacao(sessoes.GerenciadorSessoes):
+    async def ativar(self, ip):
+        pass
+
+
+def _porta_fechada():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class TestAgendador(unittest.TestCase):
+    def setUp(self):
+        self.lidos = []
+
+    def ao_ler(self, item, comando, resposta):
+        self.lidos.append((item.numero_serie, comando))
+
+    # Função que sobe o simulador com 'portas' gateways em portas livres, executa 'corrotina(portas)' e fecha tudo
+    def executar(self, corrotina, portas=1, **opcoes_simulador):
+        async def rodar():
+            simulador = Simulador(porta=0, portas=portas, porta_udp=0, **opcoes_simulador)
+            await simulador.iniciar()
+            try:
+                return await corrotina([servidor.sockets[0].getsockname()[1] for servidor in simulador._servidores])
+            finally:
+                # Deixa o simulador perceber o fechamento das conexões antes de encerrar o loop
+                await asyncio.sleep(0.05)
+                await simulador.fechar()
+        return asyncio.run(rodar())
+
+    def criar(self, inventario, **opcoes):
+        opcoes.setdefault('recuo_wait', Recuo(base=0.01, maximo=0.01))
+        return Agendador(inventario, gerenciador=_SemAtivacao(), ao_ler=self.ao_ler, semente=1, **opcoes)
+
+    def test_gateways_mais_atrasados_primeiro(self):
+        async def cenario(portas):
+            inventario = [ItemInventario('127.0.0.1', porta, 0x100 + k) for k, porta in enumerate(portas)]
+            ag = self.criar(inventario, gateways_simultaneos=1)
+            agora = time.time()
+            for atraso, estados in zip((10, 300, 50, 1000), ag.gateways.values()):
+                estados[0].proximo = agora - atraso
+            with ag.gerenciador:
+                return await ag.executar_ciclo()
+
+        relatorio = self.executar(cenario, portas=4)
+        self.assertEqual(relatorio.lidos, 4)
+        self.assertEqual([serie for serie, _ in self.lidos], [0x103, 0x101, 0x102, 0x100])
+
+    def test_adiados_quando_o_ciclo_acaba(self):
+        async def cenario(portas):
+            inventario = [ItemInventario('127.0.0.1', portas[0], 0x200 + k) for k in range(6)]
+            ag = self.criar(inventario, duracao_alvo=0.25)
+            with ag.gerenciador:
+                return await ag.executar_ciclo()
+
+        relatorio = self.executar(cenario, latencia=0.05)
+        self.assertGreaterEqual(relatorio.lidos, 1)
+        self.assertGreaterEqual(relatorio.adiados, 1)
+        self.assertEqual(relatorio.falhas, 0)
+        self.assertEqual(relatorio.lidos + relatorio.adiados, 6)
+
+    def test_recuo_limitado_ao_intervalo_e_estacionamento(self):
+        async def cenario(portas):
+            inventario = [ItemInventario('127.0.0.1', _porta_fechada(), 0x300, intervalo=0.5)]
+            ag = self.criar(inventario, max_falhas=2, tempo_estacionado=3600.0,
+                            recuo=Recuo(base=30.0, maximo=3600.0, jitter=0.0))
+            estado = next(ag.estados())
+            with ag.gerenciador:
+                relatorio = await ag.executar_ciclo()
+                self.assertEqual(relatorio.falhas, 1)
+                self.assertLessEqual(estado.proximo - time.time(), 0.5)
+                self.assertEqual(ag.estacionados(), [])
+
+                estado.proximo = 0.0
+                relatorio = await ag.executar_ciclo()
+                self.assertEqual(relatorio.falhas, 1)
+                self.assertEqual(relatorio.estacionados, 1)
+                self.assertEqual([item.numero_serie for item, _ in ag.estacionados()], [0x300])
+
+                estado.proximo = 0.0
+                relatorio = await ag.executar_ciclo()
+                self.assertEqual(relatorio.falhas + relatorio.lidos, 0)
+
+                # Fim do estacionamento: uma nova falha não estaciona de novo de imediato
+                estado.estacionado_ate = estado.proximo = time.time() - 1.0
+                relatorio = await ag.executar_ciclo()
+                self.assertEqual(relatorio.falhas, 1)
+                self.assertEqual(estado.falhas, 1)
+                self.assertEqual(ag.estacionados(), [])
+
+        self.executar(cenario)
+
+    def test_comando_sem_layout_vai_para_ao_ler_mas_nao_e_gravado(self):
+        with tempfile.TemporaryDirectory() as diretorio:
+            async def cenario(portas):
+                inventario = [ItemInventario('127.0.0.1', portas[0], 0xABCDEF, (0x14, 0x20))]
+                with ArmazenamentoLeituras(diretorio) as armazenamento:
+                    ag = self.criar(inventario, armazenamento=armazenamento)
+                    with ag.gerenciador:
+                        relatorio = await ag.executar_ciclo()
+                    return relatorio, armazenamento.medidores(), armazenamento.consultar(0xABCDEF)
+
+            relatorio, medidores, registros = self.executar(cenario)
+        self.assertEqual(relatorio.lidos, 1)
+        self.assertEqual(self.lidos, [(0xABCDEF, 0x14), (0xABCDEF, 0x20)])
+        self.assertEqual(medidores, [0xABCDEF])
+        self.assertEqual([registro.comando for registro in registros], [0x14])
+
+    def test_marca_dagua_define_o_proximo(self):
+        with tempfile.TemporaryDirectory() as diretorio:
+            with ArmazenamentoLeituras(diretorio) as armazenamento:
+                armazenamento.gravar(0x400, 0x14, [0.0] * armazenamento.valores_por_registro, instante=1000.0)
+                ag = Agendador([ItemInventario('127.0.0.1', 1, 0x400, intervalo=900.0),
+                                ItemInventario('127.0.0.1', 1, 0x401)],
+                               gerenciador=_SemAtivacao(), armazenamento=armazenamento)
+                self.assertEqual([estado.proximo for estado in ag.estados()], [1900.0, 0.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
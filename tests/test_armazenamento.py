@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+from array import array
+
+from armazenamento import ArmazenamentoLeituras
+
+VALORES = 4
+
+
+def _valores(base):
+    return [float(base + i) for i in range(VALORES)]
+
+
+# Fecha os segmentos sem salvar o índice, como se o processo tivesse terminado sem fechar o armazenamento
+def _abandonar(armazenamento):
+    for segmento in armazenamento._segmentos:
+        segmento.fechar()
+    armazenamento._segmentos = []
+
+
+class TestArmazenamentoLeituras(unittest.TestCase):
+    def setUp(self):
+        self._temporario = tempfile.TemporaryDirectory()
+        self.diretorio = self._temporario.name
+
+    def tearDown(self):
+        self._temporario.cleanup()
+
+    def abrir(self):
+        return ArmazenamentoLeituras(self.diretorio, valores_por_registro=VALORES, registros_por_segmento=8)
+
+    def test_reabrir_com_indice_salvo_antes_de_novas_gravacoes(self):
+        armazenamento = self.abrir()
+        for k in range(10):
+            armazenamento.gravar(1, 0x14, _valores(k), instante=1000 + k)
+        armazenamento.sincronizar()
+        for k in range(10, 20):
+            armazenamento.gravar(1 + k % 2, 0x14, _valores(k), instante=1000 + k)
+        _abandonar(armazenamento)
+
+        with self.abrir() as reaberto:
+            self.assertEqual(len(reaberto), 20)
+            self.assertEqual(len(reaberto._segmentos), 3)
+            leituras = reaberto.consultar(1)
+            self.assertEqual([r.instante for r in leituras], [1000.0 + k for k in range(10)] +
+                             [1000.0 + k for k in range(10, 20, 2)])
+            self.assertEqual(list(leituras[-1].valores), _valores(18))
+            self.assertEqual(reaberto.marca(2), 1019.0)
+        self.assertTrue(os.path.exists(os.path.join(self.diretorio, 'indice.bin')))
+
+    def test_instantes_fora_de_ordem(self):
+        with self.abrir() as armazenamento:
+            for instante in (1005, 1001, 1009, 1003):
+                armazenamento.gravar(7, 0x14, _valores(instante), instante=instante)
+            armazenamento.gravar_colunas([7, 7], 0x14, array('f', _valores(1002) + _valores(1000)),
+                                         instantes=[1002, 1000])
+            self.assertEqual([r.instante for r in armazenamento.consultar(7)],
+                             [1000.0, 1001.0, 1002.0, 1003.0, 1005.0, 1009.0])
+            self.assertEqual([r.instante for r in armazenamento.consultar(7, 1001, 1005)],
+                             [1001.0, 1002.0, 1003.0])
+            self.assertEqual(list(armazenamento.consultar(7, 1002, 1003)[0].valores), _valores(1002))
+            self.assertEqual(armazenamento.marca(7), 1009.0)
+            armazenamento.gravar(7, 0x14, _valores(1004), instante=1004)
+            self.assertEqual(armazenamento.marca(7), 1009.0)
+
+        with self.abrir() as reaberto:
+            self.assertEqual([r.instante for r in reaberto.consultar(7, 1003)],
+                             [1003.0, 1004.0, 1005.0, 1009.0])
+
+    def test_pendentes_pela_marca_dagua(self):
+        with self.abrir() as armazenamento:
+            armazenamento.gravar(1, 0x14, _valores(0), instante=1000)
+            armazenamento.gravar(2, 0x14, _valores(0), instante=1090)
+            self.assertEqual(armazenamento.pendentes([1, 2, 3], intervalo=60, agora=1100), [1, 3])
+
+    def test_quantidade_de_valores_incompativel(self):
+        with self.abrir() as armazenamento:
+            with self.assertRaises(ValueError):
+                armazenamento.gravar_colunas([1], 0x14, array('f', [0.0] * (VALORES + 1)), 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
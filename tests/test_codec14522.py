@@ -0,0 +1,59 @@
+import unittest
+
+import codec14522
+from benchmarks.codec import (VETORES_CRC, complementar_bytes_original, crc16_bit_a_bit,
+                              montar_comando_14_original, resposta_valida)
+from codec14522 import ENQ, TAMANHO_COMANDO, TAMANHO_RESPOSTA
+
+
+class TestCodec14522(unittest.TestCase):
+    def test_vetores_crc(self):
+        for dados, esperado in VETORES_CRC:
+            self.assertEqual(crc16_bit_a_bit(dados), esperado)
+            self.assertEqual(codec14522.crc16(dados), esperado)
+            self.assertEqual(codec14522.crc16(memoryview(dados)), esperado)
+
+    def test_crc16_incremental_em_partes(self):
+        dados = bytes(range(256)) * 3
+        for tamanho in (1, 7, 64, 257):
+            crc = codec14522.CRC16()
+            for inicio in range(0, len(dados), tamanho):
+                crc.update(dados[inicio:inicio + tamanho])
+            self.assertEqual(crc.valor, crc16_bit_a_bit(dados))
+        self.assertEqual(codec14522.CRC16(b"123456789").digest(), b'\xae\xe7')
+
+    def test_complementar_e_comandos_iguais_ao_original(self):
+        dados = bytes(range(256))
+        self.assertEqual(codec14522.complementar(dados), complementar_bytes_original(dados))
+        self.assertEqual(codec14522.complementar(memoryview(dados)), complementar_bytes_original(dados))
+        for serie in (0x000000, 0x010203, 0xFFFFFF, 0x1ABCDEF):
+            comando = codec14522.codificar_comando_14(serie)
+            self.assertEqual(len(comando), TAMANHO_COMANDO)
+            self.assertEqual(comando, montar_comando_14_original(serie & 0xFFFFFF))
+
+    def test_comando_generico(self):
+        comando = codec14522.codificar_comando_generico(0x14)
+        self.assertEqual(comando[0], ENQ)
+        self.assertEqual(codec14522.complementar(comando[1:]), bytes([0x14, 0x63, 0x00]) + b'\x45\x16')
+
+    def test_validar_quadro_em_memoryview(self):
+        resposta = resposta_valida()
+        buffer = bytearray(b'\xAA' * 10 + resposta + b'\xBB' * 10)
+        visao = memoryview(buffer)[10:10 + TAMANHO_RESPOSTA]
+        self.assertTrue(codec14522.validar_quadro(visao))
+        buffer[10] ^= 0x01
+        self.assertFalse(codec14522.validar_quadro(visao))
+        self.assertFalse(codec14522.validar_quadro(b'\x06\x00'))
+        self.assertEqual(codec14522.crc_recebido(resposta), crc16_bit_a_bit(resposta[:-2]))
+
+    def test_validar_lote_contiguo(self):
+        respostas = [resposta_valida(k) for k in range(5)]
+        respostas[3] = bytes([respostas[3][0] ^ 0xFF]) + respostas[3][1:]
+        buffer = bytearray(b''.join(respostas)) + b'\x00' * 17
+        self.assertEqual(codec14522.validar_lote_contiguo(buffer), [True, True, True, False, True])
+        self.assertEqual(codec14522.validar_lote(respostas), [True, True, True, False, True])
+        self.assertEqual(codec14522.validar_lote_contiguo(b''), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+
+import float24
+from float24 import Campo
+
+
+def _resposta(valores, numero_serie=0x010203):
+    dados = bytes([0x14]) + numero_serie.to_bytes(3, 'big') + float24.codificar_float24(valores)
+    return dados + bytes(2)
+
+
+class TestFloat24(unittest.TestCase):
+    def test_ida_e_volta(self):
+        valores = [0.0, 1.5, -2.25, 1024.0, -0.125]
+        self.assertEqual(list(float24.decodificar_float24(float24.codificar_float24(valores))), valores)
+
+    def test_lote_com_escala(self):
+        valores = [float(i) for i in range(84)]
+        respostas = [_resposta(valores, 1), _resposta(valores, 2)]
+        layout = (Campo('registradores', 4, 84, 3, 0.5, 10.0),)
+        colunas = float24.decodificar_lote(respostas, layout)
+        self.assertEqual(list(colunas['numero_serie']), [1, 2])
+        self.assertEqual(list(colunas['registradores']), [v * 0.5 + 10.0 for v in valores] * 2)
+
+    def test_quantidade_maior_que_os_dados(self):
+        with self.assertRaises(ValueError):
+            float24.decodificar_float24(b'\0' * 9, quantidade=5)
+        with self.assertRaises(ValueError):
+            float24.decodificar_float24(b'\0' * 9, posicao=12)
+        self.assertEqual(len(float24.decodificar_float24(b'\0' * 9, quantidade=3)), 3)
+
+    def test_campo_fora_do_quadro(self):
+        with self.assertRaises(ValueError):
+            float24.decodificar_lote(_resposta([0.0] * 84), (Campo('x', 250, 3),))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import socket
+import unittest
+
+import codec14522
+from codec14522 import ENQ, NAK, WAIT
+from leitor_quadros import LeitorQuadros
+
+
+def _resposta(semente=0):
+    dados = bytes([0x14]) + bytes((semente + i) & 0xFF for i in range(codec14522.TAMANHO_RESPOSTA - 3))
+    return dados + codec14522.crc16(dados).to_bytes(2, 'big')
+
+
+def _escrever(leitor, dados):
+    livre = leitor.espaco_livre()
+    livre[:len(dados)] = dados
+    leitor.confirmar(len(dados))
+
+
+class TestLeitorQuadros(unittest.TestCase):
+    def test_resposta_em_varios_segmentos(self):
+        leitor = LeitorQuadros()
+        resposta = _resposta()
+        for inicio in range(0, 250, 50):
+            _escrever(leitor, resposta[inicio:inicio + 50])
+            self.assertIsNone(leitor.proximo_quadro())
+        _escrever(leitor, resposta[250:])
+        quadro = leitor.proximo_quadro()
+        self.assertEqual(bytes(quadro), resposta)
+        self.assertTrue(codec14522.validar_quadro(quadro))
+        self.assertEqual(len(leitor), 0)
+
+    def test_bytes_em_pipeline_ficam_para_o_proximo_quadro(self):
+        leitor = LeitorQuadros()
+        primeira, segunda = _resposta(1), _resposta(2)
+        _escrever(leitor, bytes([WAIT]) + primeira + bytes([NAK]) + segunda[:100])
+        self.assertEqual(bytes(leitor.proximo_quadro()), bytes([WAIT]))
+        self.assertEqual(bytes(leitor.proximo_quadro()), primeira)
+        self.assertEqual(bytes(leitor.proximo_quadro()), bytes([NAK]))
+        self.assertIsNone(leitor.proximo_quadro())
+        self.assertEqual(len(leitor), 100)
+        _escrever(leitor, segunda[100:])
+        self.assertEqual(bytes(leitor.proximo_quadro()), segunda)
+
+    def test_consumir_ate_preserva_bytes_depois_do_enq(self):
+        leitor = LeitorQuadros()
+        resposta = _resposta(3)
+        _escrever(leitor, b'\x33\x44')
+        self.assertFalse(leitor.consumir_ate(ENQ))
+        self.assertEqual(len(leitor), 0)
+        _escrever(leitor, b'\x33' + bytes([ENQ]) + resposta[:10])
+        self.assertTrue(leitor.consumir_ate(ENQ))
+        _escrever(leitor, resposta[10:])
+        self.assertEqual(bytes(leitor.proximo_quadro()), resposta)
+
+    def test_compactacao_mantem_dados_pendentes(self):
+        tamanho = codec14522.TAMANHO_RESPOSTA
+        leitor = LeitorQuadros(capacidade=2 * tamanho)
+        respostas = [_resposta(k) for k in range(6)]
+        fluxo = b''.join(respostas)
+        recebidos = []
+        # Segmentos de tamanho que não divide o quadro forçam quadros parciais no fim do buffer
+        for inicio in range(0, len(fluxo), 97):
+            _escrever(leitor, fluxo[inicio:inicio + 97])
+            quadro = leitor.proximo_quadro()
+            while quadro is not None:
+                recebidos.append(bytes(quadro))
+                quadro = leitor.proximo_quadro()
+        self.assertEqual(recebidos, respostas)
+        self.assertGreaterEqual(len(leitor.espaco_livre()), tamanho)
+
+    def test_capacidade_menor_que_resposta(self):
+        with self.assertRaises(ValueError):
+            LeitorQuadros(capacidade=codec14522.TAMANHO_RESPOSTA - 1)
+
+    def test_preencher_do_socket(self):
+        leitor = LeitorQuadros()
+        resposta = _resposta(4)
+        a, b = socket.socketpair()
+        with a, b:
+            a.sendall(resposta[:120])
+            self.assertEqual(leitor.preencher(b), 120)
+            self.assertIsNone(leitor.proximo_quadro())
+            a.sendall(resposta[120:])
+            leitor.preencher(b)
+            self.assertEqual(bytes(leitor.proximo_quadro()), resposta)
+            a.close()
+            self.assertEqual(leitor.preencher(b), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import socket
+import unittest
+
+import medidorSaga1000
+from codec14522 import ENQ
+from leitor_quadros import LeitorQuadros
+
+
+class TestInvolucrosSincronos(unittest.TestCase):
+    def setUp(self):
+        self.medidor, self.cliente = socket.socketpair()
+
+    def tearDown(self):
+        self.medidor.close()
+        self.cliente.close()
+        medidorSaga1000.fechar_loop()
+
+    def test_esperar_enq_deixa_bytes_seguintes_no_socket(self):
+        self.medidor.sendall(b'\x33' + bytes([ENQ]) + b'\x10\x15')
+        self.assertTrue(medidorSaga1000.esperar_enq(self.cliente, timeout=1))
+        self.cliente.settimeout(1)
+        self.assertEqual(self.cliente.recv(16), b'\x10\x15')
+
+    def test_esperar_enq_com_leitor_guarda_bytes_seguintes(self):
+        leitor = LeitorQuadros()
+        self.medidor.sendall(bytes([ENQ]) + b'\x15')
+        self.assertTrue(medidorSaga1000.esperar_enq(self.cliente, timeout=1, leitor=leitor))
+        self.assertEqual(bytes(leitor.proximo_quadro()), b'\x15')
+
+    def test_esperar_enq_timeout_e_conexao_encerrada(self):
+        self.assertFalse(medidorSaga1000.esperar_enq(self.cliente, timeout=0.05))
+        self.medidor.close()
+        self.assertFalse(medidorSaga1000.esperar_enq(self.cliente, timeout=1))
+
+    def test_mesmo_socket_em_chamadas_seguidas(self):
+        self.cliente.settimeout(2.0)
+        for _ in range(3):
+            self.medidor.sendall(bytes([ENQ]))
+            self.assertTrue(medidorSaga1000.esperar_enq(self.cliente, timeout=1))
+        self.assertEqual(self.cliente.gettimeout(), 2.0)
+
+
+if __name__ == '__main__':
+    unittest.main()